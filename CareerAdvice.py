@@ -1,18 +1,31 @@
-from flask import Flask, request, render_template
-import requests
-from bs4 import BeautifulSoup
-from fuzzywuzzy import process, fuzz
+from flask import Flask, Response, abort, g, redirect, request, render_template, stream_with_context, url_for
+import hashlib
 import logging
 import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from openai import AzureOpenAI
+from response_cache import create_cache
+from program_catalog import create_catalog
+from program_matcher import ProgramMatcher
+from single_flight import SingleFlight
+from governor import create_governor, degraded_results, record_degraded, LLMUnavailable
+from static_assets import precompress, send_static
+from logging_setup import configure_logging, new_request_id, request_id, with_request_id
+from metrics import (
+    registry, timed, observe, record_usage, llm_streams, llm_errors, program_url_fallbacks, start_request_timings,
+    finish_request_timings, in_request_context
+)
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
-
-# Load configuration
-with open('config.json', 'r') as config_file:
+# Load configuration; CAREERADVICE_CONFIG points at another file, e.g. one using the offline benchmark services
+with open(os.environ.get('CAREERADVICE_CONFIG', 'config.json'), 'r') as config_file:
     config = json.load(config_file)
 
+# Configure logging
+configure_logging(config)
+
 api_key = config.get('azure_openai_api_key')
 azure_endpoint = config.get('azure_endpoint')
 api_version = config.get('api_version')
@@ -20,109 +33,466 @@ api_version = config.get('api_version')
 if not api_key:
     raise ValueError("API key not found in configuration file.")
 
+# Maximum number of program lookups run at once for a single advice response
+program_lookup_workers = int(config.get('program_lookup_workers', 9))
+# Resolve all professions of an advice response with one completion before falling back to single lookups
+batch_program_inference = config.get('batch_program_inference', True)
+# Cosine score at or above which the local program index is trusted without asking the LLM
+local_match_threshold = float(config.get('local_match_threshold', 0.7))
+# Number of locally ranked programs sent to the LLM per profession (0 sends the whole catalog); the shortlist
+# is widened by program_shortlist_growth whenever the model's answer matches none of them
+program_shortlist_size = int(config.get('program_shortlist_size', 25))
+program_shortlist_growth = int(config.get('program_shortlist_growth', 4))
+# Ask streamed completions to report their token usage in a final chunk (stream_options), which Azure supports
+# from API version 2024-09-01-preview on; streams without it are counted in careeradvice_llm_streams_total
+stream_usage = config.get('stream_usage', (api_version or "") >= "2024-09-01")
+# Add a Server-Timing header with the stage durations to every response
+timing_headers = config.get('timing_headers', False)
+# How long browsers and proxies may reuse an advice permalink page without revalidating it
+permalink_max_age = int(config.get('permalink_max_age_seconds', 24 * 60 * 60))
+
+DEFAULT_PROGRAM_URL = "https://www.appstate.edu/academics/all/"
+UNAVAILABLE_MESSAGE = "Career advice is unavailable right now. Please try again in a minute."
+# The program lookups' answer when no listed program fits; remembered like a suggestion so it is not asked again
+NO_PROGRAM = "none"
+
+# Retries are left to the governor, which paces every chat completion to the deployment's quota
 client = AzureOpenAI(
     azure_endpoint=azure_endpoint,
     api_key=api_key,
-    api_version=api_version
+    api_version=api_version,
+    max_retries=0
 )
+governor = create_governor(config)
 
 
-# Fetch the list of programs from the university's academic page
-def fetch_programs():
-    try:
-        logging.debug("Fetching programs from Appalachian State University website.")
-        url = "https://www.appstate.edu/academics/all/"
-        response = requests.get(url)
-        soup = BeautifulSoup(response.content, 'html.parser')
-
-        programs = {}
-        table = soup.find('table', id='programs-table')
-        if table:
-            rows = table.find_all('tr')
-            for row in rows:
-                cell = row.find('td')
-                if cell:
-                    program_div = cell.find('div', class_='program-name')
-                    if program_div:
-                        program_link = program_div.find('a')
-                        if program_link:
-                            program_name = program_link.get_text(strip=True).lower()
-                            program_url = program_link['href']
-                            if program_url.startswith('http'):
-                                full_url = program_url
-                            else:
-                                full_url = f"https://www.appstate.edu{program_url}"
-                            programs[program_name] = full_url
-                            logging.debug(f"Found program: {program_name} -> {full_url}")
-
-        if not programs:
-            logging.warning("No programs were fetched from the website. Please check the URL and parsing logic.")
-        else:
-            logging.debug(f"Programs fetched: {programs}")
-
-        return programs
-
-    except Exception as e:
-        logging.error(f"Error occurred while fetching programs: {str(e)}")
-        return {}
+# The program catalog starts from its on-disk snapshot and is revalidated in the background
+program_catalog = create_catalog(config)
+program_catalog.load()
+program_catalog.start_background_refresh()
+# Permalinks are pinned: a shared link must keep working after its advice expires or is evicted
+response_cache = create_cache(config, pinned_namespaces=('permalinks',))
+# Identical LLM calls already in flight are shared instead of repeated
+advice_flight = SingleFlight()
+program_flight = SingleFlight()
 
 
-programs = fetch_programs()
-program_names = list(programs.keys())
-ai_response_cache = {}
+# Chat completion through the governor, each attempt timed as the advice_llm or inference_llm stage, with
+# its tokens counted
+def chat_completion(kind, **kwargs):
+    def create(**kwargs):
+        with timed(f"{kind}_llm"):
+            return client.chat.completions.create(**kwargs)
 
+    try:
+        response = governor.call(kind, create, **kwargs)
+    except Exception:
+        llm_errors.inc(kind=kind)
+        raise
+    record_usage(kind, response)
+    return response
 
-def infer_program_url(profession, programs):
-    profession_lower = profession.lower()
-    logging.debug(f"Matching profession: {profession_lower}")
 
-    if profession_lower in ai_response_cache:
-        ai_suggested_program = ai_response_cache[profession_lower]
-    else:
-        messages = [
-            {"role": "system", "content": "You are an expert in matching professions to academic programs."},
-            {"role": "user",
-             "content": f"Given the profession '{profession}', which of the following academic programs would be most relevant based on the name and description?\n\n{chr(10).join(program_names)}\n\nPlease provide only the exact name of the most relevant program, without any additional explanation."}
-        ]
+def infer_program_url(profession, catalog):
+    program_url, ai_suggested_program = local_program_match(profession, catalog)
+    if program_url:
+        return program_url
 
-        response = client.chat.completions.create(
+    if ai_suggested_program is None:
+        try:
+            ai_suggested_program = program_flight.do(profession.lower(), request_program_suggestion, profession,
+                                                     catalog)
+        except LLMUnavailable:
+            return degraded_program_url(profession, catalog)
+
+    return match_program_url(ai_suggested_program, catalog) or default_program_url()
+
+
+# While the LLM is unavailable, use the local index's best match however weak it is
+def degraded_program_url(profession, catalog):
+    local_match, local_score = catalog.index.best(profession)
+    if not local_match:
+        return default_program_url()
+    logging.debug("LLM unavailable, using local index match %s with score %.2f", local_match, local_score)
+    record_degraded('inference', 'local_match')
+    return catalog.programs[local_match]
+
+
+def request_program_suggestion(profession, catalog):
+    size = program_shortlist_size
+    while True:
+        candidates = program_shortlist([profession], size, catalog)
+        messages = program_messages(profession, candidates)
+        response = chat_completion(
+            'inference',
             model="IndFind_Test",
             messages=messages,
             max_tokens=100,
             temperature=0.7
         )
+        record_shortlist_usage(response, messages, candidates, catalog)
+
+        program = shortlisted_program(response.choices[0].message.content, candidates, catalog)
+        if program or len(candidates) >= len(catalog.names):
+            return remember_program_suggestion(profession, program or NO_PROGRAM, catalog)
+        size = widen_shortlist(profession, size)
+
+
+# Resolve a profession without the LLM: returns (url, None) for a confident local index match (or the main
+# academics page while the catalog is empty), (None, suggestion) when an earlier suggestion is cached and
+# (None, None) when the LLM has to be asked
+def local_program_match(profession, catalog):
+    profession_lower = profession.lower()
+    logging.debug("Matching profession: %s", profession_lower)
+    if not catalog.names:
+        return default_program_url(), None
+
+    with timed('local_match'):
+        local_match, local_score = catalog.index.best(profession)
+    if local_match and local_score >= local_match_threshold:
+        logging.debug("Local index match found: %s with score %.2f", local_match, local_score)
+        return catalog.programs[local_match], None
 
-        ai_suggested_program = response.choices[0].message.content.strip().lower()
-        logging.debug(f"AI-suggested relevant program: {ai_suggested_program}")
-        ai_response_cache[profession_lower] = ai_suggested_program
+    return None, cached_program_suggestion(profession, catalog)
 
-    closest_match = process.extractOne(ai_suggested_program, program_names, scorer=fuzz.token_set_ratio)
-    logging.debug(f"Closest match found: {closest_match[0]} with score {closest_match[1]}")
 
+def program_messages(profession, candidates):
+    return [
+        {"role": "system", "content": "You are an expert in matching professions to academic programs."},
+        {"role": "user",
+         "content": f"Given the profession '{profession}', which of the following academic programs would be most relevant based on the name and description?\n\n{chr(10).join(candidates)}\n\nPlease provide only the exact name of the most relevant program, without any additional explanation. If none of them is relevant, answer NONE."}
+    ]
+
+
+# The programs sent to the LLM for these professions: the union of the top size distinct programs of each in
+# the local index, best first. Degree and concentration variants of a program count once, listed as their best
+# ranked entry, so a handful of programs with many variants cannot fill the shortlist. A size of 0, or one that
+# covers every distinct program, returns the whole catalog.
+def program_shortlist(professions, size, catalog):
+    if size <= 0 or size >= catalog.base_count:
+        return catalog.names
+    shortlist = {}
+    for matches in catalog.index.query_many(professions, len(catalog.names)):
+        bases = set()
+        for name, _ in matches:
+            base = catalog.base_names[name]
+            if base not in bases:
+                bases.add(base)
+                shortlist.setdefault(base, name)
+                if len(bases) >= size:
+                    break
+    return list(shortlist.values())
+
+
+# The shortlisted program an answer names, or None when the model answered NONE or named a program that was
+# not on the list (the shortlist is then widened)
+def shortlisted_program(content, candidates, catalog):
+    answer = content.strip().strip('."\'').lower()
+    if not answer or answer == NO_PROGRAM:
+        return None
+    if answer in candidates:
+        return answer
+    matcher = catalog.matcher if candidates is catalog.names else ProgramMatcher(candidates)
+    closest_match = matcher.extract_one(answer)
     if closest_match and closest_match[1] >= 80:
-        program_url = programs[closest_match[0]]
-        logging.debug(f"Best match found: {program_url}")
-        return program_url
+        return closest_match[0]
+    return None
+
+
+def widen_shortlist(profession, size):
+    logging.debug("No shortlisted program matched for %s, widening the shortlist beyond %s.", profession, size)
+    with shortlist_lock:
+        shortlist_stats['widened'] += 1
+    return size * max(program_shortlist_growth, 2)
+
+
+shortlist_lock = threading.Lock()
+shortlist_stats = {'lookups': 0, 'widened': 0, 'prompt_tokens': 0, 'full_catalog_prompt_tokens': 0}
+
 
+# Count the prompt tokens a shortlisted program lookup used, next to an estimate of what the same prompt would
+# have cost with the whole catalog (scaled by prompt length, since the tokenizer is not available locally)
+def record_shortlist_usage(response, messages, candidates, catalog):
+    usage = getattr(response, 'usage', None)
+    if usage is None or not usage.prompt_tokens:
+        return
+    prompt_chars = sum(len(message['content']) for message in messages)
+    full_chars = prompt_chars - len(chr(10).join(candidates)) + len(chr(10).join(catalog.names))
+    full_tokens = round(usage.prompt_tokens * full_chars / prompt_chars)
+    with shortlist_lock:
+        shortlist_stats['lookups'] += 1
+        shortlist_stats['prompt_tokens'] += usage.prompt_tokens
+        shortlist_stats['full_catalog_prompt_tokens'] += full_tokens
+    logging.debug("Program lookup used %s prompt tokens, about %s with the full catalog.", usage.prompt_tokens, full_tokens)
+
+
+# Prompt tokens saved by shortlisting so far, in this process
+def shortlist_savings():
+    with shortlist_lock:
+        stats = dict(shortlist_stats)
+    saved = stats['full_catalog_prompt_tokens'] - stats['prompt_tokens']
+    stats['saved_prompt_tokens'] = saved
+    stats['saved_ratio'] = saved / stats['full_catalog_prompt_tokens'] if stats['full_catalog_prompt_tokens'] else 0.0
+    return stats
+
+
+# Suggestions are cached with the catalog version they were picked from. A program name stays useful across
+# catalog updates (it is matched against the current catalog), but a NONE answer only holds for its catalog.
+def remember_program_suggestion(profession, content, catalog):
+    ai_suggested_program = content.strip().lower()
+    logging.debug("AI-suggested relevant program: %s", ai_suggested_program)
+    response_cache.set('program_suggestion', profession.lower(),
+                       {'program': ai_suggested_program, 'catalog': catalog.version})
+    return ai_suggested_program
+
+
+def cached_program_suggestion(profession, catalog):
+    suggestion = response_cache.get('program_suggestion', profession.lower())
+    if suggestion is None or (suggestion['program'] == NO_PROGRAM and suggestion['catalog'] != catalog.version):
+        return None
+    return suggestion['program']
+
+
+def default_program_url():
     logging.debug("No relevant match found, defaulting to main academics page.")
-    return "https://www.appstate.edu/academics/all/"
+    program_url_fallbacks.inc(reason='no_match')
+    return DEFAULT_PROGRAM_URL
+
+
+# Fuzzy match an AI-suggested program name against the catalog, returning None below the threshold
+def match_program_url(ai_suggested_program, catalog):
+    if ai_suggested_program == NO_PROGRAM:
+        return None
+    # Suggestions picked from a shortlist are exact names; fuzzy scoring would tie them with any shorter name
+    # whose words they contain
+    if ai_suggested_program in catalog.programs:
+        return catalog.programs[ai_suggested_program]
+    with timed('fuzzy_match'):
+        closest_match = catalog.matcher.extract_one(ai_suggested_program)
+    if not closest_match:
+        return None
+    logging.debug("Closest match found: %s with score %s", closest_match[0], closest_match[1])
+
+    if closest_match[1] >= 80:
+        program_url = catalog.programs[closest_match[0]]
+        logging.debug("Best match found: %s", program_url)
+        return program_url
+    return None
+
+
+# Match every profession from one advice response to a program: confident local index matches first,
+# then a single chat completion for the rest. Returns {profession: url} for the professions the batch
+# resolved; the rest are left to infer_program_url.
+def infer_program_urls(professions, catalog):
+    urls, pending = local_program_matches(professions, catalog)
+    if not pending:
+        return urls
+
+    try:
+        content, candidates = program_flight.do(batch_flight_key(pending), request_batch_suggestions, pending,
+                                                catalog)
+    except LLMUnavailable:
+        # The single lookups fall back to local matches
+        return urls
+    urls.update(match_batch_suggestions(pending, content, candidates, catalog))
+    return urls
+
+
+def batch_flight_key(professions):
+    return json.dumps(sorted(profession.lower() for profession in professions))
+
+
+# Only one shortlist size is tried for a batch: professions it cannot resolve go on to the single lookups,
+# which widen their own shortlists. Returns the answer together with the shortlist it was given.
+def request_batch_suggestions(professions, catalog):
+    candidates = program_shortlist(professions, program_shortlist_size, catalog)
+    messages = batch_program_messages(professions, candidates)
+    response = chat_completion(
+        'inference',
+        model="IndFind_Test",
+        messages=messages,
+        max_tokens=100 * len(professions),
+        temperature=0.7,
+        response_format={"type": "json_object"}
+    )
+    record_shortlist_usage(response, messages, candidates, catalog)
+    return response.choices[0].message.content, candidates
+
+
+# Batch counterpart of local_program_match: returns ({profession: url} resolved locally, [still pending])
+def local_program_matches(professions, catalog):
+    urls = {}
+    pending = []
+    professions = list(dict.fromkeys(professions))
+    if not catalog.names:
+        return {profession: default_program_url() for profession in professions}, pending
+    with timed('local_match'):
+        local_matches = catalog.index.query_many(professions)
+    for profession, matches in zip(professions, local_matches):
+        if matches and matches[0][1] >= local_match_threshold:
+            logging.debug("Local index match found for %s: %s with score %.2f", profession, matches[0][0], matches[0][1])
+            urls[profession] = catalog.programs[matches[0][0]]
+            continue
+        ai_suggested_program = cached_program_suggestion(profession, catalog)
+        if ai_suggested_program == NO_PROGRAM:
+            urls[profession] = default_program_url()
+            continue
+        if ai_suggested_program is not None:
+            program_url = match_program_url(ai_suggested_program, catalog)
+            if program_url:
+                urls[profession] = program_url
+                continue
+        pending.append(profession)
+
+    if pending:
+        logging.debug("Batch matching professions: %s", pending)
+    return urls, pending
+
+
+def batch_program_messages(professions, candidates):
+    return [
+        {"role": "system", "content": "You are an expert in matching professions to academic programs."},
+        {"role": "user",
+         "content": f"For each of the following professions, which of the academic programs listed below would be "
+                    f"most relevant based on the name and description?\n\nProfessions:\n{chr(10).join(professions)}"
+                    f"\n\nPrograms:\n{chr(10).join(candidates)}\n\nRespond with a JSON object that maps each "
+                    f"profession, exactly as written above, to the exact name of its most relevant program, or to "
+                    f"NONE if none of the programs is relevant."}
+    ]
+
+
+# Check each suggestion of a batch response against the shortlist it was given; returns {profession: url} for
+# the matches. Professions answered NONE or with an unlisted program are left to the single lookups.
+def match_batch_suggestions(professions, content, candidates, catalog):
+    urls = {}
+    try:
+        suggestions = json.loads(content)
+    except ValueError:
+        logging.warning("Batch program matching returned invalid JSON, falling back to single lookups.")
+        return urls
+    if not isinstance(suggestions, dict):
+        return urls
+
+    suggestions = {str(key).strip().lower(): value for key, value in suggestions.items()}
+    for profession in professions:
+        ai_suggested_program = suggestions.get(profession.lower())
+        if not isinstance(ai_suggested_program, str):
+            continue
+        logging.debug("AI-suggested relevant program for %s: %s", profession, ai_suggested_program.strip().lower())
+        program = shortlisted_program(ai_suggested_program, candidates, catalog)
+        if program:
+            remember_program_suggestion(profession, program, catalog)
+            urls[profession] = catalog.programs[program]
+
+    return urls
 
 
 app = Flask(__name__)
 
+# Static files are served precompressed and versioned: url_for('static', ...) adds ?v=<content hash>, and
+# versioned requests may be cached for a year
+static_versions = precompress(app.static_folder)
+static_version = hashlib.sha256(json.dumps(sorted(static_versions.items())).encode()).hexdigest()[:12]
+app.view_functions['static'] = lambda filename: send_static(app.static_folder, filename, static_versions)
+
+
+@app.url_defaults
+def version_static_urls(endpoint, values):
+    if endpoint == 'static' and values.get('filename') in static_versions:
+        values.setdefault('v', static_versions[values['filename']])
+
+request_seconds = registry.histogram(
+    'careeradvice_request_seconds', "Time to build the response of each endpoint.", ['endpoint'])
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    g.request_id_token = request_id.set(new_request_id(request.headers.get('X-Request-ID')))
+    g.degraded_token = degraded_results.set([])
+    if timing_headers:
+        g.timings_token = start_request_timings()
+
+
+@app.after_request
+def record_request_time(response):
+    elapsed = time.perf_counter() - g.request_start
+    request_seconds.observe(elapsed, endpoint=request.endpoint or 'unknown')
+    response.headers['X-Request-ID'] = request_id.get()
+    if 'timings_token' in g:
+        response.headers['Server-Timing'] = finish_request_timings(g.pop('timings_token'), elapsed)
+    return response
+
+
+@app.teardown_request
+def discard_request_timings(error=None):
+    if 'timings_token' in g:
+        finish_request_timings(g.pop('timings_token'))
+    if 'request_id_token' in g:
+        request_id.reset(g.pop('request_id_token'))
+    if 'degraded_token' in g:
+        degraded_results.reset(g.pop('degraded_token'))
+
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
 
+# Generates the advice, then redirects to its permalink so reloads and shared links are plain cacheable GETs
 @app.route('/generate_advice', methods=['POST'])
 def generate_advice():
     major = request.form['major']
     interests = request.form['interests']
     advice = generate_career_advice(major, interests)
-    professions = extract_professions(advice)
-    return render_template('advice.html', professions=professions, major=major)
+    advice_professions(advice_cache_key(major, interests), advice)
+    return redirect(url_for('advice_permalink', digest=remember_permalink(major, interests)), code=303)
+
+
+# The rendered advice page for a permalink, cached until the catalog or static files change and served with an
+# ETag so revalidations get a 304. A page built from stale advice or local program guesses is served but
+# neither cached here nor by browsers and proxies.
+@app.route('/advice/<digest>')
+def advice_permalink(digest):
+    page = response_cache.get('pages', digest)
+    version = f"{program_catalog.current.version}:{static_version}"
+    cache_control = f"public, max-age={permalink_max_age}"
+    if page is None or page['version'] != version:
+        inputs = response_cache.get('permalinks', digest)
+        if inputs is None:
+            abort(404)
+        cache_key = advice_cache_key(inputs['major'], inputs['interests'])
+        advice = generate_career_advice(inputs['major'], inputs['interests'])
+        professions = advice_professions(cache_key, advice)
+        with timed('render'):
+            html = render_template('advice.html', professions=professions, major=inputs['major'])
+        page = {'version': version, 'etag': hashlib.sha256(html.encode()).hexdigest()[:20], 'html': html}
+        if response_degraded():
+            cache_control = "no-store"
+        else:
+            response_cache.set('pages', digest, page)
+
+    headers = {'ETag': f'"{page["etag"]}"', 'Cache-Control': cache_control}
+    if request.if_none_match.contains(page['etag']):
+        return Response(status=304, headers=headers)
+    return Response(page['html'], mimetype='text/html', headers=headers)
+
+
+# Progressive advice page; the tabs are filled in from /generate_advice/stream
+@app.route('/advice')
+def advice_page():
+    major = request.args['major']
+    interests = request.args.get('interests', '')
+    return render_template('advice_stream.html', major=major, interests=interests)
+
+
+@app.route('/generate_advice/stream')
+def generate_advice_stream():
+    major = request.args['major']
+    interests = request.args.get('interests', '')
+    events = with_request_id(advice_events(major, interests), request_id.get())
+    return Response(stream_with_context(events), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 
 @app.route('/game')
@@ -130,11 +500,76 @@ def game():
     return render_template('game.html')
 
 
-def generate_career_advice(major, interests):
-    if not interests.strip():
-        interests = "general career opportunities"
+# Stats kept elsewhere in the app, read when /metrics is scraped
+def cache_requests():
+    stats = response_cache.stats()
+    return [({'namespace': namespace, 'result': result}, counts[key])
+            for namespace, counts in sorted(stats['namespaces'].items())
+            for result, key in (('hit', 'hits'), ('miss', 'misses'))]
+
+
+def single_flight_calls():
+    samples = []
+    for name, flight in (('advice', advice_flight), ('program', program_flight)):
+        stats = flight.stats()
+        samples.append(({'flight': name, 'result': 'led'}, stats['calls']))
+        samples.append(({'flight': name, 'result': 'coalesced'}, stats['coalesced']))
+    return samples
+
+
+def shortlist_prompt_tokens():
+    stats = shortlist_savings()
+    return [({'prompt': 'shortlist'}, stats['prompt_tokens']),
+            ({'prompt': 'full_catalog_estimate'}, stats['full_catalog_prompt_tokens'])]
+
+
+def catalog_age():
+    checked_at = program_catalog.current.checked_at
+    return [({}, time.time() - checked_at)] if checked_at else []
 
-    messages = [
+
+registry.collect('careeradvice_cache_requests_total', 'counter', "Response cache lookups by namespace.",
+                 cache_requests)
+registry.collect('careeradvice_cache_evictions_total', 'counter', "Response cache entries evicted.",
+                 lambda: [({}, response_cache.stats()['evictions'])])
+registry.collect('careeradvice_single_flight_calls_total', 'counter',
+                 "LLM calls led, and calls coalesced into one already in flight.", single_flight_calls)
+registry.collect('careeradvice_shortlist_prompt_tokens_total', 'counter',
+                 "Prompt tokens of shortlisted program lookups, next to the full catalog estimate.",
+                 shortlist_prompt_tokens)
+registry.collect('careeradvice_shortlist_widened_total', 'counter', "Program lookups that widened the shortlist.",
+                 lambda: [({}, shortlist_savings()['widened'])])
+registry.collect('careeradvice_catalog_programs', 'gauge', "Programs in the current catalog.",
+                 lambda: [({'version': program_catalog.current.version}, len(program_catalog.current.names))])
+registry.collect('careeradvice_catalog_age_seconds', 'gauge', "Seconds since the catalog was last revalidated.",
+                 catalog_age)
+
+
+@app.route('/metrics')
+def metrics():
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+# Rate limited or open circuit with nothing cached to fall back on
+@app.errorhandler(LLMUnavailable)
+def llm_unavailable(error):
+    return Response(UNAVAILABLE_MESSAGE, status=503, mimetype='text/plain',
+                    headers={'Retry-After': retry_after_header(error)})
+
+
+def retry_after_header(error):
+    return str(max(1, round(error.retry_after or 30)))
+
+
+# Normalize the (major, interests) pair so equivalent requests share one cached advice response
+def advice_cache_key(major, interests):
+    major = " ".join(major.lower().split())
+    interests = " ".join(interests.lower().split()) or "general career opportunities"
+    return json.dumps([major, interests])
+
+
+def advice_messages(major, interests):
+    return [
         {"role": "system",
          "content": "You are an expert in giving career advice and work within the Appalachian State University "
                     "Career Development Center."},
@@ -145,32 +580,348 @@ def generate_career_advice(major, interests):
                     f"like this: '1. Profession Name: Description'."}
     ]
 
-    response = client.chat.completions.create(
+
+def generate_career_advice(major, interests):
+    cache_key = advice_cache_key(major, interests)
+    advice = response_cache.get('advice', cache_key)
+    if advice is not None:
+        logging.debug("Using cached advice for %s", cache_key)
+        return advice
+
+    try:
+        return advice_flight.do(cache_key, request_career_advice, major, interests, cache_key)
+    except LLMUnavailable as e:
+        return stale_advice(cache_key, e)
+
+
+# Expired cached advice for when the LLM is unavailable; re-raises error when there is none
+def stale_advice(cache_key, error):
+    advice = response_cache.get('advice', cache_key, allow_expired=True)
+    if advice is None:
+        raise error
+    logging.warning("LLM unavailable, serving stale advice for %s", cache_key)
+    record_degraded('advice', 'stale_cache')
+    return advice
+
+
+def request_career_advice(major, interests, cache_key):
+    if not interests.strip():
+        interests = "general career opportunities"
+
+    response = chat_completion(
+        'advice',
         model="IndFind_Test",
-        messages=messages,
+        messages=advice_messages(major, interests),
         max_tokens=600,
         temperature=0.7
     )
 
-    return response.choices[0].message.content.strip()
+    advice = response.choices[0].message.content.strip()
+    response_cache.set('advice', cache_key, advice)
+    return advice
+
+
+# Same as generate_career_advice, but yields the advice text in chunks as the model produces it.
+# Cached advice, or advice another request is already generating, is yielded as a single chunk;
+# streamed advice is cached once the stream completes. When the client of the leading request goes away,
+# the rest of the stream is read in the background, so the requests sharing it still get the advice.
+def stream_career_advice(major, interests):
+    cache_key = advice_cache_key(major, interests)
+    advice = response_cache.get('advice', cache_key)
+    if advice is not None:
+        logging.debug("Using cached advice for %s", cache_key)
+        yield advice
+        return
+
+    call, leader = advice_flight.join(cache_key)
+    if not leader:
+        yield advice_flight.wait(call)
+        return
+
+    start = time.perf_counter()
+    try:
+        if not interests.strip():
+            interests = "general career opportunities"
+        try:
+            stream = governor.call(
+                'advice',
+                client.chat.completions.create,
+                model="IndFind_Test",
+                messages=advice_messages(major, interests),
+                max_tokens=600,
+                temperature=0.7,
+                stream=True,
+                **({'stream_options': {'include_usage': True}} if stream_usage else {})
+            )
+        except LLMUnavailable as e:
+            advice = stale_advice(cache_key, e)
+    except BaseException as e:
+        if isinstance(e, Exception):
+            llm_errors.inc(kind='advice')
+        advice_flight.finish(cache_key, call, error=e)
+        raise
+    if advice is not None:
+        advice_flight.finish(cache_key, call, advice)
+        yield advice
+        return
+
+    # Not yield from, which would close chunks along with this generator
+    chunks = read_advice_stream(stream, start, cache_key, call)
+    try:
+        for chunk in chunks:
+            yield chunk
+    except GeneratorExit:
+        threading.Thread(target=in_request_context(finish_advice_stream), args=(chunks,), name="advice-stream",
+                         daemon=True).start()
+        raise
+
+
+# Yields the content of a streamed advice completion, then caches the advice and finishes the single-flight
+# call with it, or with the error the stream failed with
+def read_advice_stream(stream, start, cache_key, call):
+    advice, error = None, None
+    try:
+        parts = []
+        usage_chunk = None
+        for chunk in stream:
+            if getattr(chunk, 'usage', None) is not None:
+                usage_chunk = chunk
+            if chunk.choices and chunk.choices[0].delta.content:
+                if not parts:
+                    observe('advice_llm_first_token', time.perf_counter() - start)
+                parts.append(chunk.choices[0].delta.content)
+                yield chunk.choices[0].delta.content
+        observe('advice_llm', time.perf_counter() - start)
+        record_usage('advice', usage_chunk)
+        llm_streams.inc(kind='advice', usage='reported' if usage_chunk is not None else 'missing')
+
+        advice = "".join(parts).strip()
+        response_cache.set('advice', cache_key, advice)
+    except Exception as e:
+        llm_errors.inc(kind='advice')
+        error = e
+        raise
+    finally:
+        if error is None and advice is None:
+            error = RuntimeError("Advice stream was closed before it completed.")
+        advice_flight.finish(cache_key, call, advice, error)
 
 
-def extract_professions(advice):
-    professions = []
+# Read the rest of an advice stream whose client went away, for the requests waiting on the same advice
+def finish_advice_stream(chunks):
+    try:
+        for _ in chunks:
+            pass
+    except Exception as e:
+        logging.error("Error occurred while finishing abandoned career advice: %s", e)
+
+
+# Split streamed text into lines, yielding each line as soon as its newline arrives
+def iter_lines(chunks):
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split("\n")
+        yield from lines
+    if buffer:
+        yield buffer
+
+
+# Parse professions from advice lines, yielding each one as soon as its numbered line is complete.
+# Unnumbered lines that follow are appended to the description of the profession yielded last.
+def iter_professions(lines):
     current_profession = None
-    for line in advice.split("\n"):
+    for line in lines:
         if line.startswith(tuple(str(i) + "." for i in range(1, 10))):
             profession_name = line.split(":")[0].split(".", 1)[1].strip()
             current_profession = {
                 'name': profession_name,
                 'description': line.split(":", 1)[1].strip(),
                 'more_info': f"https://www.google.com/search?q=What+does+a+{profession_name.replace(' ', '+')}+do?",
-                'program_url': infer_program_url(profession_name, programs)
+                'program_url': DEFAULT_PROGRAM_URL
             }
-            professions.append(current_profession)
+            yield current_profession
         elif current_profession:
             current_profession['description'] += " " + line.strip()
 
+
+def extract_professions(advice):
+    with timed('parse_professions'):
+        professions = list(iter_professions(advice.split("\n")))
+    with timed('resolve_programs'):
+        resolve_program_urls(professions)
+    return professions
+
+
+# extract_professions, cached under the advice's cache key (see warm_cache.py)
+def advice_professions(cache_key, advice):
+    professions = cached_professions(cache_key, advice)
+    if professions is None:
+        professions = extract_professions(advice)
+        store_professions(cache_key, advice, professions)
+    return professions
+
+
+# Cached professions are only used with the advice text and catalog version they were resolved from
+def cached_professions(cache_key, advice):
+    entry = response_cache.get('professions', cache_key)
+    if entry is None or entry['advice'] != advice_digest(advice) or entry['catalog'] != program_catalog.current.version:
+        return None
+    return entry['professions']
+
+
+def store_professions(cache_key, advice, professions, catalog_version=None):
+    # Program URLs resolved while the LLM was unavailable are local guesses, not worth keeping
+    if response_degraded():
+        return
+    response_cache.set('professions', cache_key, {'advice': advice_digest(advice),
+                                                  'catalog': catalog_version or program_catalog.current.version,
+                                                  'professions': professions})
+
+
+# Whether the current request was served stale advice or local program guesses, or may have been (the breaker
+# is not closed; outside a request that is all there is to go on)
+def response_degraded():
+    return bool(degraded_results.get()) or governor.breaker.state != 'closed'
+
+
+def advice_digest(advice):
+    return hashlib.sha256(advice.encode()).hexdigest()[:16]
+
+
+# Permalinks are addressed by the hash of the normalized inputs, so equivalent requests share one URL
+def permalink_digest(major, interests):
+    return hashlib.sha256(advice_cache_key(major, interests).encode()).hexdigest()[:20]
+
+
+def remember_permalink(major, interests):
+    digest = permalink_digest(major, interests)
+    if response_cache.get('permalinks', digest) is None:
+        response_cache.set('permalinks', digest, {'major': major, 'interests': interests})
+    return digest
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+# Server-sent events for the progressive advice page:
+#   profession - a profession (index, name, description, more_info), sent again when its description grows
+#   program    - the program URL of the profession at index, as soon as its lookup finishes
+#   done/error - the end of the stream; done carries the permalink of the finished advice
+# The permalink is only remembered once the advice is complete, so failed or abandoned streams leave nothing
+# behind.
+def advice_events(major, interests):
+    # Runs after the request hooks, so it tracks its own degraded results
+    degraded_results.set([])
+    try:
+        yield from stream_advice_events(major, interests)
+    finally:
+        degraded_results.set(None)
+
+
+def stream_advice_events(major, interests):
+    cache_key = advice_cache_key(major, interests)
+    advice = response_cache.get('advice', cache_key)
+    professions = cached_professions(cache_key, advice) if advice is not None else None
+    if professions is not None:
+        yield from cached_advice_events(professions, advice_permalink_url(major, interests))
+        return
+
+    catalog = program_catalog.current
+    professions = []
+    sent_descriptions = []
+    lookups = {}
+    executor = ThreadPoolExecutor(max_workers=program_lookup_workers, thread_name_prefix="program-lookup")
+
+    def profession_updates():
+        for index, profession in enumerate(professions):
+            if index == len(sent_descriptions):
+                sent_descriptions.append(None)
+            if sent_descriptions[index] != profession['description']:
+                sent_descriptions[index] = profession['description']
+                yield sse_event('profession', {'index': index, 'name': profession['name'],
+                                               'description': profession['description'],
+                                               'more_info': profession['more_info']})
+
+    def program_updates(futures):
+        for future in futures:
+            index = lookups.pop(future)
+            professions[index]['program_url'] = future.result()
+            yield sse_event('program', {'index': index, 'program_url': professions[index]['program_url']})
+
+    try:
+        for profession in iter_professions(iter_lines(stream_career_advice(major, interests))):
+            professions.append(profession)
+            yield from profession_updates()
+            lookups[executor.submit(in_request_context(safe_infer_program_url), profession['name'],
+                                    catalog)] = len(professions) - 1
+            yield from program_updates([future for future in lookups if future.done()])
+
+        yield from profession_updates()
+        yield from program_updates(as_completed(list(lookups)))
+
+        advice = response_cache.get('advice', cache_key)
+        if advice is not None:
+            store_professions(cache_key, advice, professions, catalog.version)
+        yield sse_event('done', {'count': len(professions), 'permalink': advice_permalink_url(major, interests)})
+    except Exception as e:
+        logging.error("Error occurred while streaming career advice: %s", e)
+        yield sse_event('error', {'message': "Career advice is unavailable right now. Please try again."})
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def advice_permalink_url(major, interests):
+    return url_for('advice_permalink', digest=remember_permalink(major, interests))
+
+
+# The whole event stream at once for advice whose professions are already cached
+def cached_advice_events(professions, permalink):
+    for index, profession in enumerate(professions):
+        yield sse_event('profession', {'index': index, 'name': profession['name'],
+                                       'description': profession['description'],
+                                       'more_info': profession['more_info']})
+        yield sse_event('program', {'index': index, 'program_url': profession['program_url']})
+    yield sse_event('done', {'count': len(professions), 'permalink': permalink})
+
+
+# Look up the program for a single profession, falling back to the main academics page on failure
+def safe_infer_program_url(profession_name, catalog):
+    try:
+        return infer_program_url(profession_name, catalog)
+    except Exception as e:
+        logging.error("Error occurred while matching program for '%s': %s", profession_name, e)
+        program_url_fallbacks.inc(reason='error')
+        return DEFAULT_PROGRAM_URL
+
+
+# Resolve the program URL of every profession: one batched completion first, then concurrent
+# single lookups (at most program_lookup_workers at a time) for whatever the batch could not resolve
+def resolve_program_urls(professions):
+    if not professions:
+        return professions
+
+    catalog = program_catalog.current
+    names = [profession['name'] for profession in professions]
+    resolved = {}
+    if batch_program_inference:
+        try:
+            resolved = infer_program_urls(names, catalog)
+        except Exception as e:
+            logging.error("Error occurred while batch matching programs: %s", e)
+
+    unresolved = [name for name in dict.fromkeys(names) if name not in resolved]
+    workers = min(program_lookup_workers, len(unresolved))
+    if workers <= 1:
+        resolved.update((name, safe_infer_program_url(name, catalog)) for name in unresolved)
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="program-lookup") as executor:
+            resolved.update(zip(unresolved, executor.map(in_request_context(safe_infer_program_url), unresolved,
+                                                         [catalog] * len(unresolved))))
+
+    for profession in professions:
+        profession['program_url'] = resolved[profession['name']]
     return professions
 
 
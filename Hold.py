@@ -1,11 +1,13 @@
 from openai import AzureOpenAI
 import customtkinter as ctk
 import webbrowser
-import requests
-from bs4 import BeautifulSoup
 from fuzzywuzzy import process, fuzz
 import logging
 import json
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from program_catalog import create_catalog
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -85,11 +87,34 @@ base_profession_to_url = {
 
 # Initialize a list to keep track of tab names
 tab_names = []
+# Relevant Program button of each tab, filled in as the program lookups finish
+program_buttons = {}
 
+# Every click starts a new generation; results of an older one are dropped and its worker stops early
+current_generation = 0
+# Callbacks posted by the worker threads, run on the Tk main loop by process_ui_calls
+ui_calls = queue.SimpleQueue()
+program_lookups = ThreadPoolExecutor(max_workers=int(config.get('program_lookup_workers', 9)),
+                                     thread_name_prefix="program-lookup")
 
-# Function to generate career advice
-def generate_career_advice(major, interests):
-    messages = [
+# The program catalog is loaded once, in the background, from the snapshot shared with the web app (or the
+# website when there is none yet) and reused by every click
+program_catalog = create_catalog(config)
+catalog_ready = threading.Event()
+
+
+def load_catalog():
+    try:
+        program_catalog.load()
+    finally:
+        catalog_ready.set()
+
+
+threading.Thread(target=load_catalog, name="catalog-load", daemon=True).start()
+
+
+def advice_messages(major, interests):
+    return [
         {"role": "system",
          "content": "You are an expert in giving career advice and work within the Appalachian State University "
                     "Career Development Center."},
@@ -100,71 +125,167 @@ def generate_career_advice(major, interests):
                     f"Profession Name: Description'."}
     ]
 
-    response = client.chat.completions.create(
+
+# Stream the career advice line by line, stopping as soon as a newer click has replaced this generation
+def stream_advice_lines(major, interests, generation):
+    stream = client.chat.completions.create(
         model="IndFind_Test",
-        messages=messages,
+        messages=advice_messages(major, interests),
         max_tokens=600,
-        temperature=0.7
+        temperature=0.7,
+        stream=True
     )
+    buffer = ""
+    try:
+        for chunk in stream:
+            if generation != current_generation:
+                return
+            if chunk.choices and chunk.choices[0].delta.content:
+                buffer += chunk.choices[0].delta.content
+                *lines, buffer = buffer.split("\n")
+                yield from lines
+        yield buffer
+    finally:
+        stream.close()
+
+
+# Extract professions and their descriptions from the advice; each one is yielded once its description is
+# complete, i.e. when the next profession starts or the advice ends
+def iter_professions(lines):
+    profession, description = None, ""
+    for line in lines:
+        if line.startswith(("1.", "2.", "3.", "4.", "5.", "6.", "7.", "8.", "9.")):
+            if profession:
+                yield profession, description
+            profession = line.split(":")[0].split(".", 1)[1].strip()
+            description = line.split(":", 1)[1].strip() + "\n"
+        elif profession:
+            description += line.strip() + "\n"
+    if profession:
+        yield profession, description
+
+
+# Run fn(*args) on the main loop, unless a newer click has started by then
+def post(generation, fn, *args):
+    ui_calls.put((generation, fn, args))
+
+
+# A failing callback (e.g. a TclError) is logged and skipped; the loop always reschedules itself
+def process_ui_calls():
+    try:
+        while True:
+            try:
+                generation, fn, args = ui_calls.get_nowait()
+            except queue.Empty:
+                break
+            if generation == current_generation:
+                try:
+                    fn(*args)
+                except Exception as e:
+                    logging.error("Error occurred while updating the window: %s", e)
+    finally:
+        window.after(50, process_ui_calls)
+
+
+# Worker thread of one click: adds a tab per profession as the advice streams in and resolves the programs
+# in the background. Only the program lookups wait for the catalog, so the first tabs appear while it loads.
+def advice_worker(generation, major, interests):
+    try:
+        count = 0
+        for profession, description in iter_professions(stream_advice_lines(major, interests, generation)):
+            post(generation, add_profession_tab, profession, description)
+            program_lookups.submit(program_lookup, generation, profession)
+            count += 1
+        post(generation, finish_advice, count)
+    except Exception as e:
+        logging.error("Error occurred while generating career advice: %s", e)
+        post(generation, show_status, "Something went wrong while generating advice. Please try again.")
+
 
-    return response.choices[0].message.content.strip()
+def program_lookup(generation, profession):
+    catalog_ready.wait()
+    if generation != current_generation:
+        return
+    try:
+        program_url = infer_program_url(profession, program_catalog.current)
+    except Exception as e:
+        logging.error("Error occurred while matching program for '%s': %s", profession, e)
+        program_url = "https://www.appstate.edu/academics/all/"
+    post(generation, set_program_url, profession, program_url)
 
 
-# Integrate the updated logic into the main application
+# Start a new generation: clear the tabs and hand the request to a worker thread so the window stays responsive
 def on_generate_click():
+    global current_generation, tab_names
+    current_generation += 1
     major = major_entry.get()
     interests = interests_entry.get()
-    advice = generate_career_advice(major, interests)
 
     # Clear existing tabs
-    global tab_names
     for tab in tab_names:
         notebook.delete(tab)
     tab_names = []
+    program_buttons.clear()
 
-    # Fetch the latest programs
-    programs = fetch_programs()
+    show_status("Generating advice...")
+    threading.Thread(target=advice_worker, args=(current_generation, major, interests), name="advice-worker",
+                     daemon=True).start()
+
+
+def show_status(text):
+    status_label.configure(text=text)
 
-    # Extract professions and their descriptions from the advice
-    professions = {}
-    current_profession = None
-    for line in advice.split("\n"):
-        if line.startswith(("1.", "2.", "3.", "4.", "5.", "6.", "7.", "8.", "9.")):
-            profession_name = line.split(":")[0].split(".", 1)[1].strip()
-            current_profession = profession_name
-            professions[current_profession] = line.split(":", 1)[1].strip() + "\n"
-        elif current_profession:
-            professions[current_profession] += line.strip() + "\n"
 
-    # Create tabs for each profession and display the description and more info link
-    for profession, description in professions.items():
-        tab = notebook.add(profession)
-        tab_names.append(profession)
+# Create a tab for the profession and display the description and more info link; the program button is
+# enabled once its lookup finishes
+def add_profession_tab(profession, description):
+    if profession in tab_names:
+        return
+    tab = notebook.add(profession)
+    tab_names.append(profession)
 
-        # Create a Google search URL for more info
-        info_url = f"https://www.google.com/search?q=What+does+a+{profession.replace(' ', '+')}+do?"
+    # Create a Google search URL for more info
+    info_url = f"https://www.google.com/search?q=What+does+a+{profession.replace(' ', '+')}+do?"
 
-        # Get the relevant App State program URL using the improved infer function
-        program_url = infer_program_url(profession, programs)
+    description_text = ctk.CTkTextbox(tab, width=400, height=150, wrap="word")
+    description_text.insert("0.0", description.strip())
+    description_text.pack(padx=5, pady=5)
 
-        # Display profession description and more info link in the tab
-        description_text = ctk.CTkTextbox(tab, width=400, height=150, wrap="word")
-        description_text.insert("0.0", description.strip())
-        description_text.pack(padx=5, pady=5)
+    more_info_button = ctk.CTkButton(tab, text="More Info", command=lambda url=info_url: open_website(url),
+                                     fg_color="#FFCC00", hover_color="#666666", text_color="#003366")
+    more_info_button.pack(padx=5, pady=5)
 
-        more_info_button = ctk.CTkButton(tab, text="More Info", command=lambda url=info_url: open_website(url),
-                                         fg_color="#FFCC00", hover_color="#666666", text_color="#003366")
-        more_info_button.pack(padx=5, pady=5)
+    program_button = ctk.CTkButton(tab, text="Finding Program...", state="disabled",
+                                   fg_color="#FFCC00", hover_color="#666666", text_color="#003366")
+    program_button.pack(padx=5, pady=5)
+    program_buttons[profession] = program_button
 
-        program_button = ctk.CTkButton(tab, text="Relevant Program", command=lambda url=program_url: open_website(url),
-                                       fg_color="#FFCC00", hover_color="#666666", text_color="#003366")
-        program_button.pack(padx=5, pady=5)
+
+def set_program_url(profession, program_url):
+    program_button = program_buttons.get(profession)
+    if program_button is not None:
+        program_button.configure(text="Relevant Program", state="normal",
+                                 command=lambda url=program_url: open_website(url))
+
+
+def finish_advice(count):
+    show_status("" if count else "No career paths were found. Please try again.")
 
     # Resize the window based on the tab content
     window.update_idletasks()
     window.geometry(f"{window.winfo_reqwidth()}x{window.winfo_reqheight()}")
 
 
+# Drop the queued program lookups and the connections of those in flight, so closing the window does not wait
+# for them
+def on_close():
+    global current_generation
+    current_generation += 1
+    program_lookups.shutdown(wait=False, cancel_futures=True)
+    client.close()
+    window.destroy()
+
+
 # Function to open a website
 def open_website(url):
     webbrowser.open_new(url)
@@ -175,6 +296,7 @@ ctk.set_appearance_mode("dark")  # Set dark mode
 window = ctk.CTk()
 window.title("Career Advice Generator")
 window.geometry("800x600")
+window.protocol("WM_DELETE_WINDOW", on_close)
 
 # Create a frame for navigation links
 links_frame = ctk.CTkFrame(window, fg_color="#333333")
@@ -187,58 +309,14 @@ def create_link(label, url):
     link.bind("<Button-1>", lambda e: open_website(url))
 
 
-# Fetch the list of programs from the university's academic page
 # Cache for AI responses
 ai_response_cache = {}
 
 
-def fetch_programs():
-    try:
-        logging.debug("Fetching programs from Appalachian State University website.")
-        url = "https://www.appstate.edu/academics/all/"
-        response = requests.get(url)
-        soup = BeautifulSoup(response.content, 'html.parser')
-
-        programs = {}
-        table = soup.find('table', id='programs-table')
-        if table:
-            rows = table.find_all('tr')
-            for row in rows:
-                cell = row.find('td')
-                if cell:
-                    program_div = cell.find('div', class_='program-name')
-                    if program_div:
-                        program_link = program_div.find('a')
-                        if program_link:
-                            program_name = program_link.get_text(strip=True).lower()
-                            program_url = program_link['href']
-                            if program_url.startswith('http'):
-                                full_url = program_url
-                            else:
-                                full_url = f"https://www.appstate.edu{program_url}"
-                            programs[program_name] = full_url
-                            logging.debug(f"Found program: {program_name} -> {full_url}")
-
-        if not programs:
-            logging.warning("No programs were fetched from the website. Please check the URL and parsing logic.")
-        else:
-            logging.debug(f"Programs fetched: {programs}")
-
-        return programs
-
-    except Exception as e:
-        logging.error(f"Error occurred while fetching programs: {str(e)}")
-        return {}
-
-
-# Preprocess and clean program names once
-programs = fetch_programs()
-program_names = list(programs.keys())
-
-
-def infer_program_url(profession, programs):
+def infer_program_url(profession, catalog):
     profession_lower = profession.lower()
-    logging.debug(f"Matching profession: {profession_lower}")
+    program_names = catalog.names
+    logging.debug("Matching profession: %s", profession_lower)
 
     # Check the cache first
     if profession_lower in ai_response_cache:
@@ -259,18 +337,18 @@ def infer_program_url(profession, programs):
         )
 
         ai_suggested_program = response.choices[0].message.content.strip().lower()
-        logging.debug(f"AI-suggested relevant program: {ai_suggested_program}")
+        logging.debug("AI-suggested relevant program: %s", ai_suggested_program)
 
         # Cache the response
         ai_response_cache[profession_lower] = ai_suggested_program
 
     # Use fuzzy matching to find the closest match
     closest_match = process.extractOne(ai_suggested_program, program_names, scorer=fuzz.token_set_ratio)
-    logging.debug(f"Closest match found: {closest_match[0]} with score {closest_match[1]}")
+    logging.debug("Closest match found: %s with score %s", closest_match[0], closest_match[1])
 
     if closest_match and closest_match[1] >= 80:  # Use a threshold to ensure good matches
-        program_url = programs[closest_match[0]]
-        logging.debug(f"Best match found: {program_url}")
+        program_url = catalog.programs[closest_match[0]]
+        logging.debug("Best match found: %s", program_url)
         return program_url
 
     logging.debug("No relevant match found, defaulting to main academics page.")
@@ -300,10 +378,14 @@ generate_button = ctk.CTkButton(input_frame, text="Generate Advice", command=on_
                                 fg_color="#FFCC00", hover_color="#666666", text_color="#003366")
 generate_button.pack(pady=10)
 
+status_label = ctk.CTkLabel(input_frame, text="", text_color="#FFFFFF")
+status_label.pack(pady=5)
+
 # Create and position the notebook widget for tabs
 notebook = ctk.CTkTabview(window, width=400, fg_color="#333333", text_color="#FFFFFF", border_color="#FFFFFF")
 notebook.pack(pady=10, fill="both", expand=True)
 
 # Start the main event loop
+process_ui_calls()
 window.mainloop()
 
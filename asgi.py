@@ -0,0 +1,300 @@
+# ASGI entry point that keeps hundreds of slow advice requests in flight in a single process:
+#
+#     uvicorn asgi:app --workers 2
+#     gunicorn -k uvicorn.workers.UvicornWorker asgi:app
+#
+# POST /generate_advice runs on the event loop with one pooled AsyncAzureOpenAI client, so a request waiting
+# on the LLM no longer pins a worker; like the Flask route it answers with a redirect to the advice permalink.
+# Every other route (/, /advice, /game, /static, ...) is still served by the Flask app in CareerAdvice through
+# asgiref's WSGI adapter. The adapter would run them all on one shared thread (thread_sensitive), which
+# serializes the routes that wait on the LLM (the SSE stream, uncached advice permalinks), so they run in a
+# thread pool of their own, wsgi_threads wide; each open advice stream holds one of its threads.
+#
+# The response cache (SQLite) and the local index and fuzzy matching block, so the async path runs them in the
+# loop's default thread pool with asyncio.to_thread rather than stalling every request on the loop.
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+import httpx
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from openai import AsyncAzureOpenAI, DefaultAsyncHttpxClient
+
+import CareerAdvice
+from CareerAdvice import (
+    config, response_cache, advice_flight, program_flight, batch_flight_key, program_lookup_workers,
+    batch_program_inference, advice_cache_key, advice_messages, iter_professions, local_program_match,
+    local_program_matches, program_messages, batch_program_messages, remember_program_suggestion, match_program_url, match_batch_suggestions,
+    default_program_url, program_shortlist, program_shortlist_size, widen_shortlist, record_shortlist_usage,
+    shortlisted_program, NO_PROGRAM,
+    timing_headers, request_seconds, governor, degraded_program_url, stale_advice, retry_after_header,
+    cached_professions, store_professions, remember_permalink,
+    DEFAULT_PROGRAM_URL, UNAVAILABLE_MESSAGE
+)
+from governor import LLMUnavailable, degraded_results
+from logging_setup import new_request_id, request_id
+from metrics import (
+    timed, record_usage, llm_errors, program_url_fallbacks, start_request_timings, finish_request_timings
+)
+
+# One connection pool shared by every request in the process; like the sync client it leaves retries to the
+# governor shared with CareerAdvice
+async_client = AsyncAzureOpenAI(
+    azure_endpoint=CareerAdvice.azure_endpoint,
+    api_key=CareerAdvice.api_key,
+    api_version=CareerAdvice.api_version,
+    max_retries=0,
+    http_client=DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=int(config.get('async_max_connections', 200)),
+            max_keepalive_connections=int(config.get('async_max_keepalive_connections', 100)),
+            keepalive_expiry=30
+        ),
+        timeout=httpx.Timeout(float(config.get('request_timeout_seconds', 60)), connect=5.0)
+    )
+)
+
+wsgi_executor = ThreadPoolExecutor(max_workers=int(config.get('wsgi_threads', 100)), thread_name_prefix="wsgi")
+
+
+class ThreadPoolWsgiToAsgiInstance(WsgiToAsgiInstance):
+    run_wsgi_app = sync_to_async(WsgiToAsgiInstance.run_wsgi_app.__wrapped__, thread_sensitive=False,
+                                 executor=wsgi_executor)
+
+
+class ThreadPoolWsgiToAsgi(WsgiToAsgi):
+    async def __call__(self, scope, receive, send):
+        await ThreadPoolWsgiToAsgiInstance(self.wsgi_application, self.duplicate_header_limit)(scope, receive, send)
+
+
+flask_app = ThreadPoolWsgiToAsgi(CareerAdvice.app)
+
+
+async def chat_completion(kind, **kwargs):
+    async def create(**kwargs):
+        with timed(f"{kind}_llm"):
+            return await async_client.chat.completions.create(**kwargs)
+
+    try:
+        response = await governor.call_async(kind, create, **kwargs)
+    except Exception:
+        llm_errors.inc(kind=kind)
+        raise
+    record_usage(kind, response)
+    return response
+
+
+async def generate_career_advice(major, interests):
+    cache_key = advice_cache_key(major, interests)
+    advice = await asyncio.to_thread(response_cache.get, 'advice', cache_key)
+    if advice is not None:
+        logging.debug("Using cached advice for %s", cache_key)
+        return advice
+
+    try:
+        return await advice_flight.do_async(cache_key, request_career_advice, major, interests, cache_key)
+    except LLMUnavailable as e:
+        return await asyncio.to_thread(stale_advice, cache_key, e)
+
+
+async def request_career_advice(major, interests, cache_key):
+    if not interests.strip():
+        interests = "general career opportunities"
+
+    response = await chat_completion(
+        'advice',
+        model="IndFind_Test",
+        messages=advice_messages(major, interests),
+        max_tokens=600,
+        temperature=0.7
+    )
+
+    advice = response.choices[0].message.content.strip()
+    await asyncio.to_thread(response_cache.set, 'advice', cache_key, advice)
+    return advice
+
+
+async def infer_program_url(profession, catalog):
+    program_url, ai_suggested_program = await asyncio.to_thread(local_program_match, profession, catalog)
+    if program_url:
+        return program_url
+
+    if ai_suggested_program is None:
+        try:
+            ai_suggested_program = await program_flight.do_async(profession.lower(), request_program_suggestion,
+                                                                 profession, catalog)
+        except LLMUnavailable:
+            return await asyncio.to_thread(degraded_program_url, profession, catalog)
+
+    return await asyncio.to_thread(match_program_url, ai_suggested_program, catalog) or default_program_url()
+
+
+async def request_program_suggestion(profession, catalog):
+    size = program_shortlist_size
+    while True:
+        candidates = await asyncio.to_thread(program_shortlist, [profession], size, catalog)
+        messages = program_messages(profession, candidates)
+        response = await chat_completion(
+            'inference',
+            model="IndFind_Test",
+            messages=messages,
+            max_tokens=100,
+            temperature=0.7
+        )
+        record_shortlist_usage(response, messages, candidates, catalog)
+
+        program = await asyncio.to_thread(shortlisted_program, response.choices[0].message.content, candidates,
+                                          catalog)
+        if program or len(candidates) >= len(catalog.names):
+            return await asyncio.to_thread(remember_program_suggestion, profession, program or NO_PROGRAM,
+                                           catalog)
+        size = widen_shortlist(profession, size)
+
+
+async def infer_program_urls(professions, catalog):
+    urls, pending = await asyncio.to_thread(local_program_matches, professions, catalog)
+    if not pending:
+        return urls
+
+    try:
+        content, candidates = await program_flight.do_async(batch_flight_key(pending), request_batch_suggestions,
+                                                            pending, catalog)
+    except LLMUnavailable:
+        return urls
+    urls.update(await asyncio.to_thread(match_batch_suggestions, pending, content, candidates, catalog))
+    return urls
+
+
+async def request_batch_suggestions(professions, catalog):
+    candidates = await asyncio.to_thread(program_shortlist, professions, program_shortlist_size, catalog)
+    messages = batch_program_messages(professions, candidates)
+    response = await chat_completion(
+        'inference',
+        model="IndFind_Test",
+        messages=messages,
+        max_tokens=100 * len(professions),
+        temperature=0.7,
+        response_format={"type": "json_object"}
+    )
+    record_shortlist_usage(response, messages, candidates, catalog)
+    return response.choices[0].message.content, candidates
+
+
+# Async version of CareerAdvice.resolve_program_urls; the single lookups are bounded by a semaphore
+async def resolve_program_urls(professions):
+    if not professions:
+        return professions
+
+    catalog = CareerAdvice.program_catalog.current
+    names = [profession['name'] for profession in professions]
+    resolved = {}
+    if batch_program_inference:
+        try:
+            resolved = await infer_program_urls(names, catalog)
+        except Exception as e:
+            logging.error("Error occurred while batch matching programs: %s", e)
+
+    semaphore = asyncio.Semaphore(program_lookup_workers)
+
+    async def lookup(name):
+        async with semaphore:
+            try:
+                return await infer_program_url(name, catalog)
+            except Exception as e:
+                logging.error("Error occurred while matching program for '%s': %s", name, e)
+                program_url_fallbacks.inc(reason='error')
+                return DEFAULT_PROGRAM_URL
+
+    unresolved = [name for name in dict.fromkeys(names) if name not in resolved]
+    resolved.update(zip(unresolved, await asyncio.gather(*(lookup(name) for name in unresolved))))
+
+    for profession in professions:
+        profession['program_url'] = resolved[profession['name']]
+    return professions
+
+
+async def advice_professions(cache_key, advice):
+    professions = await asyncio.to_thread(cached_professions, cache_key, advice)
+    if professions is None:
+        with timed('parse_professions'):
+            professions = list(iter_professions(advice.split("\n")))
+        with timed('resolve_programs'):
+            professions = await resolve_program_urls(professions)
+        await asyncio.to_thread(store_professions, cache_key, advice, professions)
+    return professions
+
+
+async def read_form(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get('body', b"")
+        if not message.get('more_body'):
+            break
+    return {key: values[0] for key, values in parse_qs(body.decode(), keep_blank_values=True).items()}
+
+
+async def send_response(send, status, body, content_type="text/html; charset=utf-8", headers=()):
+    body = body.encode()
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', content_type.encode()), (b'content-length', str(len(body)).encode()),
+                            *((name.encode(), value.encode()) for name, value in headers)]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def generate_advice(scope, receive, send):
+    start = time.perf_counter()
+    form = await read_form(receive)
+    if 'major' not in form:
+        await send_response(send, 400, "Missing form field: major", "text/plain; charset=utf-8")
+        return
+    timings_token = start_request_timings() if timing_headers else None
+    request_headers = dict(scope['headers'])
+    request_id_token = request_id.set(new_request_id(request_headers.get(b'x-request-id', b'').decode('latin-1')))
+    degraded_token = degraded_results.set([])
+    headers = [('X-Request-ID', request_id.get())]
+    try:
+        advice = await generate_career_advice(form['major'], form.get('interests', ''))
+        await advice_professions(advice_cache_key(form['major'], form.get('interests', '')), advice)
+        digest = await asyncio.to_thread(remember_permalink, form['major'], form.get('interests', ''))
+        status, body, content_type = 303, "", "text/plain; charset=utf-8"
+        headers.append(('Location', f"{scope.get('root_path', '')}/advice/{digest}"))
+    except LLMUnavailable as e:
+        status, body, content_type = 503, UNAVAILABLE_MESSAGE, "text/plain; charset=utf-8"
+        headers.append(('Retry-After', retry_after_header(e)))
+    except Exception as e:
+        logging.error("Error occurred while generating career advice: %s", e)
+        status, body, content_type = 500, "Internal Server Error", "text/plain; charset=utf-8"
+
+    elapsed = time.perf_counter() - start
+    request_seconds.observe(elapsed, endpoint='generate_advice')
+    if timings_token is not None:
+        headers.append(('Server-Timing', finish_request_timings(timings_token, elapsed)))
+    degraded_results.reset(degraded_token)
+    request_id.reset(request_id_token)
+    await send_response(send, status, body, content_type, headers)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await async_client.close()
+            wsgi_executor.shutdown(wait=False, cancel_futures=True)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+    elif scope['type'] == 'http' and scope['path'] == '/generate_advice' and scope['method'] == 'POST':
+        await generate_advice(scope, receive, send)
+    else:
+        await flask_app(scope, receive, send)
@@ -0,0 +1,205 @@
+# Bulk advice for a whole cohort: reads (major, interests) records from JSONL or CSV and writes one JSON line per
+# student with the advice, the parsed professions and their program URLs.
+#
+#     python batch_advice.py cohort.csv advice.jsonl --concurrency 16
+#     python batch_advice.py cohort.jsonl advice.jsonl --resume
+#
+# Records are read as they are needed and results are written as soon as they complete, so the output is not
+# in input order. The output file doubles as the checkpoint: with --resume, records whose id already has a
+# successful result there are skipped, so a crashed or interrupted run picks up where it stopped and retries
+# the records that failed. Each record's id is its --id-field value, or its line/row number when the field is
+# missing.
+#
+# Concurrency adapts to Azure rate limits: when a record still fails with a 429 after the governor's own retries,
+# or the circuit breaker is open, the number of records in flight is halved and the record is retried after
+# Retry-After (or an exponential backoff); every success lets concurrency grow back toward --concurrency.
+
+import argparse
+import csv
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from openai import RateLimitError
+
+from governor import LLMUnavailable
+
+
+def read_records(path, format=None, id_field='id'):
+    format = format or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+    with (sys.stdin if path == '-' else open(path, 'r', newline='', encoding='utf-8')) as input_file:
+        if format == 'csv':
+            for row_number, record in enumerate(csv.DictReader(input_file), 1):
+                yield str(record.get(id_field) or row_number), record
+        else:
+            for line_number, line in enumerate(input_file, 1):
+                if line.strip():
+                    record = json.loads(line)
+                    yield str(record.get(id_field) or line_number), record
+
+
+# Ids that already have a successful result in the output file. A line cut off by a crash is dropped from
+# the file so the next result starts on a line of its own.
+def completed_ids(path):
+    done = set()
+    try:
+        with open(path, 'rb+') as output_file:
+            content = output_file.read()
+            complete = content.rfind(b"\n") + 1
+            if complete < len(content):
+                output_file.truncate(complete)
+    except FileNotFoundError:
+        return done
+    for line in content[:complete].splitlines():
+        try:
+            result = json.loads(line)
+        except ValueError:
+            continue
+        if 'error' not in result:
+            done.add(str(result['id']))
+    return done
+
+
+# An AIMD limit on the records in flight: halved on a rate limit, grown by one every limit successes
+class ConcurrencyLimit:
+    def __init__(self, maximum):
+        self.maximum = maximum
+        self.limit = float(maximum)
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+    def throttle(self):
+        with self._condition:
+            self.limit = max(1.0, self.limit / 2)
+
+    def succeed(self):
+        with self._condition:
+            self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+
+def retry_delay(error, attempt):
+    retry_after = getattr(error, 'retry_after', None)
+    if retry_after is None and getattr(error, 'response', None) is not None:
+        retry_after = error.response.headers.get('retry-after')
+    try:
+        return float(retry_after)
+    except (TypeError, ValueError):
+        return min(60.0, 2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+class BatchRunner:
+    def __init__(self, output_file, concurrency, max_retries):
+        import CareerAdvice
+        self.career_advice = CareerAdvice
+        self.output_file = output_file
+        self.limit = ConcurrencyLimit(concurrency)
+        self.max_retries = max_retries
+        self.write_lock = threading.Lock()
+        self.counts = {'done': 0, 'failed': 0, 'rate_limited': 0}
+
+    def advise(self, record):
+        major = (record.get('major') or "").strip()
+        if not major:
+            raise ValueError("Record has no major.")
+        interests = record.get('interests') or ""
+        advice = self.career_advice.generate_career_advice(major, interests)
+        return {'major': major, 'interests': interests, 'advice': advice,
+                'professions': self.career_advice.extract_professions(advice)}
+
+    def run_record(self, record_id, record):
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    result = {'id': record_id, **self.advise(record)}
+                    self.limit.succeed()
+                    break
+                except (RateLimitError, LLMUnavailable) as e:
+                    self.limit.throttle()
+                    with self.write_lock:
+                        self.counts['rate_limited'] += 1
+                    if attempt == self.max_retries:
+                        raise
+                    time.sleep(retry_delay(e, attempt))
+        except Exception as e:
+            logging.error("Error occurred while generating advice for record %s: %s", record_id, e)
+            result = {'id': record_id, 'major': record.get('major'), 'interests': record.get('interests'),
+                      'error': str(e)}
+        finally:
+            self.limit.release()
+        self.write(result)
+
+    def write(self, result):
+        with self.write_lock:
+            self.output_file.write(json.dumps(result) + "\n")
+            self.output_file.flush()
+            self.counts['failed' if 'error' in result else 'done'] += 1
+
+    def run(self, records, skip=frozenset(), progress_interval=10.0):
+        start = last_report = time.time()
+        with ThreadPoolExecutor(max_workers=self.limit.maximum, thread_name_prefix="batch-advice") as executor:
+            try:
+                for record_id, record in records:
+                    if record_id in skip:
+                        continue
+                    self.limit.acquire()
+                    executor.submit(self.run_record, record_id, record)
+                    if time.time() - last_report >= progress_interval:
+                        last_report = time.time()
+                        self.report(start)
+            except KeyboardInterrupt:
+                logging.warning("Interrupted, waiting for the records in flight; rerun with --resume to continue.")
+                executor.shutdown(wait=True, cancel_futures=True)
+        self.report(start)
+
+    def report(self, start):
+        with self.write_lock:
+            counts = dict(self.counts)
+        elapsed = max(time.time() - start, 1e-9)
+        print(f"{counts['done']} done, {counts['failed']} failed, {counts['rate_limited']} rate limited, "
+              f"{(counts['done'] + counts['failed']) / elapsed:.2f} records/s, concurrency {int(self.limit.limit)}",
+              file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate career advice for every record of a JSONL or CSV file.")
+    parser.add_argument('input', help="JSONL or CSV file with major and interests, or - for JSONL on stdin")
+    parser.add_argument('output', help="JSONL file the results are appended to")
+    parser.add_argument('--format', choices=['jsonl', 'csv'], help="input format, by default from the extension")
+    parser.add_argument('--id-field', default='id')
+    parser.add_argument('--concurrency', type=int, default=8, help="maximum records in flight")
+    parser.add_argument('--max-retries', type=int, default=5, help="retries of a record after a rate limit")
+    parser.add_argument('--resume', action='store_true', help="skip records that already have a result")
+    parser.add_argument('--log-level', default='WARNING')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level, format='%(asctime)s - %(levelname)s - %(message)s')
+    skip = completed_ids(args.output) if args.resume else set()
+    if skip:
+        print(f"Resuming, {len(skip)} records already done.", file=sys.stderr)
+    elif not args.resume and os.path.exists(args.output) and os.path.getsize(args.output):
+        parser.error(f"{args.output} already has results; pass --resume to continue it.")
+
+    with open(args.output, 'a', encoding='utf-8') as output_file:
+        runner = BatchRunner(output_file, args.concurrency, args.max_retries)
+        runner.run(read_records(args.input, args.format, args.id_field), skip)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+# Benchmark of the streaming catalog parser against the BeautifulSoup parser it replaces.
+#
+#     python -m benchmarks.bench_catalog_parser --programs 300 --scale 1 10
+#     python -m benchmarks.bench_catalog_parser --page academics.html   # a saved copy of the live page
+#
+# Without --page the page is synthesized by benchmarks.fixtures.catalog_page, scaled by --scale.
+
+import argparse
+import time
+
+from bs4 import BeautifulSoup
+
+from benchmarks.fixtures import catalog_page, scaled_catalog
+from program_catalog import parse_program_chunks, parse_programs
+
+CHUNK_SIZE = 64 * 1024
+
+
+# The original fetch_programs parsing, kept here as the reference
+def soup_parse_programs(content):
+    soup = BeautifulSoup(content, 'html.parser')
+
+    programs = {}
+    table = soup.find('table', id='programs-table')
+    if table:
+        rows = table.find_all('tr')
+        for row in rows:
+            cell = row.find('td')
+            if cell:
+                program_div = cell.find('div', class_='program-name')
+                if program_div:
+                    program_link = program_div.find('a')
+                    if program_link:
+                        program_name = program_link.get_text(strip=True).lower()
+                        program_url = program_link['href']
+                        if program_url.startswith('http'):
+                            full_url = program_url
+                        else:
+                            full_url = f"https://www.appstate.edu{program_url}"
+                        programs[program_name] = full_url
+
+    return programs
+
+
+def best_time(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def run(label, page, repeat):
+    chunks = [page[i:i + CHUNK_SIZE] for i in range(0, len(page), CHUNK_SIZE)]
+    soup_time, expected = best_time(lambda: soup_parse_programs(page), repeat)
+    stream_time, actual = best_time(lambda: parse_program_chunks(chunks), repeat)
+    whole_time, whole = best_time(lambda: parse_programs(page), repeat)
+
+    identical = expected == actual == whole
+    print(f"{label:>10}  {len(page) / 1024:8.0f} KiB  {len(expected):>6} programs  "
+          f"BeautifulSoup {soup_time * 1000:8.1f} ms  streaming {stream_time * 1000:7.1f} ms  "
+          f"whole {whole_time * 1000:7.1f} ms  speedup {soup_time / stream_time:5.1f}x  "
+          f"{'identical' if identical else 'MISMATCH'}")
+    if not identical:
+        for name in sorted(set(expected) ^ set(actual))[:5]:
+            print(f"    {name!r}: soup={expected.get(name)} streaming={actual.get(name)}")
+    return identical
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the streaming catalog parser against BeautifulSoup.")
+    parser.add_argument('--programs', type=int, default=300, help="programs on the unscaled synthetic page")
+    parser.add_argument('--scale', type=int, nargs='+', default=[1, 10])
+    parser.add_argument('--page', help="benchmark a saved copy of the academics page instead")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.page:
+        with open(args.page, 'rb') as page_file:
+            pages = [(args.page.rsplit('/', 1)[-1][:10], page_file.read())]
+    else:
+        pages = [(f"{scale}x", catalog_page(scaled_catalog(args.programs * scale))) for scale in args.scale]
+    identical = all([run(label, page, args.repeat) for label, page in pages])
+    raise SystemExit(0 if identical else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+# Micro-benchmarks of the advice pipeline against the offline services (see benchmarks.offline):
+#
+#     python -m benchmarks.bench_pipeline --programs 300 --repeat 50
+#     python -m benchmarks.bench_pipeline --latency 0 --tokens-per-second 1e9   # app overhead only
+#
+# Uncached runs get a fresh in-memory response cache for every repetition, so each one goes through the LLM.
+
+import argparse
+import logging
+import statistics
+import tempfile
+import time
+
+from benchmarks import fake_azure, offline
+
+
+def report(name, times):
+    times = sorted(times)
+    print(f"{name:<44} n {len(times):>4}  mean {statistics.fmean(times) * 1000:9.2f} ms  "
+          f"p50 {times[len(times) // 2] * 1000:9.2f} ms  p95 {times[int(len(times) * 0.95) - 1] * 1000:9.2f} ms  "
+          f"max {times[-1] * 1000:9.2f} ms")
+
+
+def bench(name, fn, repeat, setup=None):
+    times = []
+    for number in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn(number)
+        times.append(time.perf_counter() - start)
+    report(name, times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of the advice pipeline, offline.")
+    parser.add_argument('--repeat', type=int, default=30)
+    offline.add_arguments(parser)
+    parser.set_defaults(latency=0.05)
+    args = parser.parse_args()
+
+    services = offline.start(args, tempfile.mkdtemp(prefix="careeradvice-bench-"))
+    services.set_config()
+    logging.disable(logging.INFO)
+    import CareerAdvice
+    from program_catalog import fetch_programs
+    from response_cache import MemoryCache
+
+    catalog = CareerAdvice.program_catalog.current
+    advice = fake_azure.career_advice("computer science", "video games", count=9)
+    professions = list(fake_azure.PROFESSIONS)
+
+    def fresh_cache():
+        CareerAdvice.response_cache = MemoryCache()
+
+    print(f"{len(catalog.names)} programs, fake LLM latency {args.latency * 1000:.0f} ms\n")
+
+    bench("fetch_programs", lambda n: fetch_programs(services.catalog.url), args.repeat)
+    bench("catalog refresh (304)", lambda n: CareerAdvice.program_catalog.refresh(), args.repeat)
+
+    bench("iter_professions (9 professions)",
+          lambda n: list(CareerAdvice.iter_professions(advice.split("\n"))), args.repeat)
+    bench("extract_professions, uncached", lambda n: CareerAdvice.extract_professions(advice), args.repeat,
+          setup=fresh_cache)
+    CareerAdvice.extract_professions(advice)
+    bench("extract_professions, cached programs", lambda n: CareerAdvice.extract_professions(advice), args.repeat)
+
+    bench("infer_program_url, uncached",
+          lambda n: CareerAdvice.infer_program_url(professions[n % len(professions)], catalog), args.repeat,
+          setup=fresh_cache)
+    for profession in professions:
+        CareerAdvice.infer_program_url(profession, catalog)
+    bench("infer_program_url, cached suggestion",
+          lambda n: CareerAdvice.infer_program_url(professions[n % len(professions)], catalog), args.repeat)
+    bench("match_program_url (ProgramMatcher)",
+          lambda n: CareerAdvice.match_program_url(professions[n % len(professions)].lower(), catalog), args.repeat)
+
+    bench("generate_career_advice, uncached",
+          lambda n: CareerAdvice.generate_career_advice("computer science", f"video games {n}"), args.repeat,
+          setup=fresh_cache)
+    bench("stream_career_advice, uncached",
+          lambda n: list(CareerAdvice.stream_career_advice("computer science", f"video games {n}")), args.repeat,
+          setup=fresh_cache)
+
+    print(f"\nFake Azure OpenAI: {services.azure.stats}")
+    services.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+# Micro-benchmark of ProgramMatcher against the process.extractOne scan it replaces.
+#
+#     python -m benchmarks.bench_program_matcher --sizes 300 1000 5000 --queries 100
+
+import argparse
+import logging
+import time
+import warnings
+
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore")
+    from fuzzywuzzy import process, fuzz
+
+from benchmarks.fixtures import scaled_catalog, suggestion_queries
+from program_matcher import ProgramMatcher
+
+
+def run(size, query_count):
+    programs = scaled_catalog(size)
+    names = list(programs)
+    queries = suggestion_queries(names, query_count)
+
+    start = time.perf_counter()
+    matcher = ProgramMatcher(names)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    expected = [process.extractOne(query, names, scorer=fuzz.token_set_ratio) for query in queries]
+    scan_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = [matcher.extract_one(query) for query in queries]
+    matcher_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matcher.match_many(queries)
+    many_time = time.perf_counter() - start
+
+    mismatches = [(query, e, a) for query, e, a in zip(queries, expected, actual) if e != a]
+    print(f"{len(names):>6} programs  build {build_time * 1000:8.1f} ms  "
+          f"extractOne {scan_time / len(queries) * 1e6:9.1f} us/query  "
+          f"ProgramMatcher {matcher_time / len(queries) * 1e6:8.1f} us/query  "
+          f"match_many {many_time / len(queries) * 1e6:8.1f} us/query  "
+          f"speedup {scan_time / matcher_time:6.1f}x  mismatches {len(mismatches)}")
+    for query, e, a in mismatches[:5]:
+        print(f"    {query!r}: extractOne={e} matcher={a}")
+    return not mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ProgramMatcher against process.extractOne.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[300, 1000, 5000])
+    parser.add_argument('--queries', type=int, default=100)
+    args = parser.parse_args()
+
+    # extractOne logs a warning for every empty query
+    logging.disable(logging.WARNING)
+    identical = all([run(size, args.queries) for size in args.sizes])
+    raise SystemExit(0 if identical else 1)
+
+
+if __name__ == '__main__':
+    main()
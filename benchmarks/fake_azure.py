@@ -0,0 +1,248 @@
+# Local stand-in for the Azure OpenAI chat completions API, so the app can be benchmarked without network
+# access or API costs:
+#
+#     python -m benchmarks.fake_azure --port 8701 --latency 0.8 --tokens-per-second 150 --rate-limit-ratio 0.05
+#
+# and point config.json's azure_endpoint at http://127.0.0.1:8701/. It answers the three prompts the app sends
+# (career advice, single and batch program lookups) from the prompt itself, supports stream=True, reports token
+# usage, and can inject 429 responses with a Retry-After header, either at random or above a concurrency limit.
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PROFESSIONS = [
+    "Software Developer", "Data Analyst", "Registered Nurse", "Financial Analyst", "Elementary School Teacher",
+    "Marketing Manager", "Civil Engineer", "Graphic Designer", "Physical Therapist", "Accountant",
+    "Environmental Scientist", "Social Worker", "Journalist", "Supply Chain Analyst", "Clinical Psychologist",
+    "Urban Planner", "Music Teacher", "Public Health Specialist", "Information Security Analyst", "Economist",
+    "Athletic Trainer", "Museum Curator", "Nutritionist", "Geologist", "Actuary", "Interior Designer",
+    "Policy Analyst", "Hotel Manager", "Speech-Language Pathologist", "Research Chemist",
+]
+
+ADVICE_PROMPT = re.compile(r"majoring in (.*) with interests in (.*?)\. What career paths")
+SINGLE_PROMPT = re.compile(r"Given the profession '(.*)', which of the following academic programs.*?\n\n(.*)\n\n"
+                           r"Please provide", re.S)
+BATCH_PROMPT = re.compile(r"Professions:\n(.*)\n\nPrograms:\n(.*)\n\nRespond with a JSON object", re.S)
+
+
+def count_tokens(text):
+    return len(text) // 4 + 1
+
+
+def career_advice(major, interests, count=5):
+    seed = int(hashlib.sha256(f"{major}|{interests}".encode()).hexdigest(), 16)
+    professions = random.Random(seed).sample(PROFESSIONS, count)
+    lines = [f"Here are some career paths that fit a {major} major with interests in {interests}:", ""]
+    for number, profession in enumerate(professions, 1):
+        lines.append(f"{number}. {profession}: A {profession.lower()} applies what you learn in {major} every "
+                     f"day. The role suits students interested in {interests} and offers steady growth.")
+        lines.append("")
+    lines.append("Visit the Career Development Center to talk through these options.")
+    return "\n".join(lines)
+
+
+# The candidate sharing the most words with the profession, or NONE when no candidate shares a word
+def closest_program(profession, candidates):
+    words = set(profession.lower().split())
+    best = max(candidates, key=lambda name: len(words & set(name.split())), default="")
+    return best if words & set(best.split()) else "NONE"
+
+
+def answer(messages):
+    prompt = messages[-1]['content']
+    match = ADVICE_PROMPT.search(prompt)
+    if match:
+        return career_advice(*match.groups())
+    match = BATCH_PROMPT.search(prompt)
+    if match:
+        candidates = match.group(2).split("\n")
+        return json.dumps({profession: closest_program(profession, candidates)
+                           for profession in match.group(1).split("\n")})
+    match = SINGLE_PROMPT.search(prompt)
+    if match:
+        return closest_program(match.group(1), match.group(2).split("\n"))
+    return "I am not sure."
+
+
+class FakeAzureServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 512
+
+    def __init__(self, address, latency=0.5, jitter=0.2, tokens_per_second=200.0, rate_limit_ratio=0.0,
+                 max_concurrency=0, retry_after=1.0, seed=None):
+        super().__init__(address, FakeAzureHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.tokens_per_second = tokens_per_second
+        self.rate_limit_ratio = rate_limit_ratio
+        self.max_concurrency = max_concurrency
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.stats = {'requests': 0, 'completions': 0, 'streams': 0, 'rate_limited': 0}
+
+    # Clients that hang up mid-response (a killed load test) are not worth a traceback
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/"
+
+    # Admit a request, or return False when it should get a 429
+    def admit(self):
+        with self.lock:
+            self.stats['requests'] += 1
+            limited = (self.max_concurrency and self.in_flight >= self.max_concurrency) or \
+                self.random.random() < self.rate_limit_ratio
+            if limited:
+                self.stats['rate_limited'] += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def first_token_delay(self):
+        with self.lock:
+            return max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter) * self.latency)
+
+
+class FakeAzureHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b"{}")
+        if not re.match(r"/openai/deployments/[^/]+/chat/completions", self.path):
+            self.send_json(404, {'error': {'code': 'NotFound', 'message': f"No route for {self.path}"}})
+            return
+        if not self.server.admit():
+            self.send_json(429, {'error': {'code': '429', 'message': "Rate limit is exceeded. Try again later."}},
+                           {'Retry-After': f"{self.server.retry_after:g}",
+                            'retry-after-ms': str(int(self.server.retry_after * 1000))})
+            return
+        try:
+            content = answer(body.get('messages', []))
+            if body.get('stream'):
+                self.stream_completion(body, content)
+            else:
+                self.send_completion(body, content)
+        finally:
+            self.server.release()
+
+    def send_json(self, status, data, headers=None):
+        payload = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def usage(self, body, content):
+        prompt_tokens = sum(count_tokens(message.get('content', "")) for message in body.get('messages', []))
+        completion_tokens = count_tokens(content)
+        return {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens}
+
+    def send_completion(self, body, content):
+        usage = self.usage(body, content)
+        time.sleep(self.server.first_token_delay() + usage['completion_tokens'] / self.server.tokens_per_second)
+        with self.server.lock:
+            self.server.stats['completions'] += 1
+        self.send_json(200, {
+            'id': f"chatcmpl-fake-{time.monotonic_ns()}", 'object': 'chat.completion', 'created': int(time.time()),
+            'model': body.get('model', 'fake'),
+            'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': content}}],
+            'usage': usage,
+        })
+
+    def stream_completion(self, body, content):
+        time.sleep(self.server.first_token_delay())
+        with self.server.lock:
+            self.server.stats['streams'] += 1
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        created = int(time.time())
+        pieces = re.findall(r"\S*\s*", content)
+        per_piece = count_tokens(content) / self.server.tokens_per_second / max(len(pieces), 1)
+        for piece in [piece for piece in pieces if piece] + [None]:
+            delta = {'content': piece} if piece is not None else {}
+            chunk = {'id': 'chatcmpl-fake-stream', 'object': 'chat.completion.chunk', 'created': created,
+                     'model': body.get('model', 'fake'),
+                     'choices': [{'index': 0, 'delta': delta, 'finish_reason': None if piece is not None else 'stop'}]}
+            self.write_chunk(f"data: {json.dumps(chunk)}\n\n")
+            if piece is not None:
+                time.sleep(per_piece)
+        # Like the API with stream_options={"include_usage": true}: one last chunk without choices
+        if (body.get('stream_options') or {}).get('include_usage'):
+            chunk = {'id': 'chatcmpl-fake-stream', 'object': 'chat.completion.chunk', 'created': created,
+                     'model': body.get('model', 'fake'), 'choices': [], 'usage': self.usage(body, content)}
+            self.write_chunk(f"data: {json.dumps(chunk)}\n\n")
+        self.write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def write_chunk(self, text):
+        data = text.encode()
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+# Start a fake server on a background thread; port 0 picks a free port (see server.url)
+def serve(port=0, host='127.0.0.1', **options):
+    server = FakeAzureServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, name="fake-azure", daemon=True).start()
+    return server
+
+
+def add_arguments(parser):
+    parser.add_argument('--latency', type=float, default=0.5, help="seconds until the first token")
+    parser.add_argument('--jitter', type=float, default=0.2, help="latency varies by up to this fraction")
+    parser.add_argument('--tokens-per-second', type=float, default=200.0)
+    parser.add_argument('--rate-limit-ratio', type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument('--max-concurrency', type=int, default=0, help="answer 429 above this many requests in flight")
+    parser.add_argument('--retry-after', type=float, default=1.0, help="Retry-After seconds sent with a 429")
+
+
+def server_options(args):
+    return {'latency': args.latency, 'jitter': args.jitter, 'tokens_per_second': args.tokens_per_second,
+            'rate_limit_ratio': args.rate_limit_ratio, 'max_concurrency': args.max_concurrency,
+            'retry_after': args.retry_after}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a fake Azure OpenAI chat completions API.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8701)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = FakeAzureServer((args.host, args.port), **server_options(args))
+    print(f"Fake Azure OpenAI listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(server.stats)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+# Serves a synthetic academics page (benchmarks.fixtures.catalog_page) in place of appstate.edu, with ETag and
+# Last-Modified validators so conditional refreshes get 304s:
+#
+#     python -m benchmarks.fake_catalog --port 8702 --programs 300
+#
+# and set programs_url in config.json to http://127.0.0.1:8702/academics/all/.
+
+import argparse
+import hashlib
+import sys
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.fixtures import catalog_page, scaled_catalog
+
+CATALOG_PATH = '/academics/all/'
+
+
+class FakeCatalogServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, programs=300, latency=0.0):
+        super().__init__(address, FakeCatalogHandler)
+        self.latency = latency
+        self.requests = 0
+        self.set_programs(scaled_catalog(programs))
+
+    # Replace the page, e.g. to test a refresh picking up a changed catalog
+    def set_programs(self, programs):
+        self.programs = programs
+        self.page = catalog_page(programs)
+        self.etag = f'"{hashlib.sha256(self.page).hexdigest()[:16]}"'
+        self.last_modified = formatdate(time.time(), usegmt=True)
+
+    # Clients that hang up mid-response (a killed load test) are not worth a traceback
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}{CATALOG_PATH}"
+
+
+class FakeCatalogHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        server.requests += 1
+        time.sleep(server.latency)
+        if self.path != CATALOG_PATH:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        self.send_response(304 if self.headers.get('If-None-Match') == server.etag else 200)
+        self.send_header('ETag', server.etag)
+        self.send_header('Last-Modified', server.last_modified)
+        if self.headers.get('If-None-Match') == server.etag:
+            self.end_headers()
+            return
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(server.page)))
+        self.end_headers()
+        self.wfile.write(server.page)
+
+
+# Start a catalog server on a background thread; port 0 picks a free port (see server.url)
+def serve(port=0, host='127.0.0.1', **options):
+    server = FakeCatalogServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, name="fake-catalog", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a synthetic academics page.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8702)
+    parser.add_argument('--programs', type=int, default=300)
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds before each response")
+    args = parser.parse_args()
+
+    server = FakeCatalogServer((args.host, args.port), programs=args.programs, latency=args.latency)
+    print(f"Fake catalog with {len(server.programs)} programs at {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
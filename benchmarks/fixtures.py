@@ -0,0 +1,112 @@
+import random
+
+# Program names in the style of the appstate.edu academics catalog
+BASE_PROGRAMS = [
+    "accounting", "actuarial sciences", "anthropology", "appalachian studies", "applied physics", "art education",
+    "art history", "athletic training", "biology", "building science", "business administration",
+    "chemistry", "child development", "communication disorders", "communication studies", "computer science",
+    "criminal justice", "dance studies", "economics", "elementary education", "english", "entrepreneurship",
+    "environmental science", "exercise science", "finance and banking", "geography", "geology",
+    "global studies", "graphic design", "health care management", "history", "hospitality and tourism management",
+    "industrial design", "information technology", "interior design", "international business", "journalism",
+    "languages, literatures, and cultures", "management", "marketing", "mathematics", "middle grades education",
+    "music education", "music performance", "nursing", "nutrition and foods", "philosophy", "physics",
+    "political science", "psychology", "public health", "recreation management", "religious studies",
+    "risk management and insurance", "social work", "sociology", "special education", "statistics",
+    "supply chain management", "sustainable development", "sustainable technology", "theatre arts",
+    "women's, gender, and sexuality studies",
+]
+
+DEGREES = ["(b.s.)", "(b.a.)", "(m.s.)", "(m.a.)", "minor", "certificate", "(ph.d.)", "(ed.d.)", "(b.f.a.)",
+           "(m.b.a.)"]
+CONCENTRATIONS = ["general", "applied", "teaching", "professional", "research", "community", "data", "policy",
+                  "clinical", "design", "leadership", "analytics", "global", "rural", "sustainability"]
+
+
+def slugify(name):
+    return "".join(c if c.isalnum() else "-" for c in name).strip("-").replace("--", "-")
+
+
+# A catalog of {name: url} with at least size programs, scaled up from BASE_PROGRAMS with degree and
+# concentration variants the way the real catalog lists them
+def scaled_catalog(size, seed=0):
+    rng = random.Random(seed)
+    programs = {}
+    for name in BASE_PROGRAMS:
+        programs[name] = f"https://www.appstate.edu/academics/id/{slugify(name)}/"
+    while len(programs) < size:
+        base = rng.choice(BASE_PROGRAMS)
+        name = f"{base} {rng.choice(DEGREES)}"
+        if rng.random() < 0.6:
+            name = f"{base} - {rng.choice(CONCENTRATIONS)} {rng.choice(CONCENTRATIONS)} {rng.choice(DEGREES)}"
+        programs[name] = f"https://www.appstate.edu/academics/id/{slugify(name)}/"
+    return programs
+
+
+# Program suggestions the way the model returns them: exact names, different casing and punctuation,
+# dropped degree suffixes, reordered words, typos and the occasional unrelated answer
+def suggestion_queries(names, count, seed=1):
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        name = rng.choice(names)
+        kind = rng.random()
+        if kind < 0.25:
+            queries.append(name)
+        elif kind < 0.45:
+            queries.append(name.title().replace(",", ""))
+        elif kind < 0.65:
+            queries.append(name.split(" (")[0].split(" - ")[0])
+        elif kind < 0.8:
+            words = name.split()
+            rng.shuffle(words)
+            queries.append(" ".join(words))
+        elif kind < 0.95:
+            position = rng.randrange(len(name))
+            queries.append(name[:position] + name[position + 1:])
+        else:
+            queries.append(rng.choice(["underwater basket weaving", "n/a", "i am not sure", ""]))
+    return queries
+
+
+# An academics page in the layout of appstate.edu/academics/all/ listing programs: site chrome and inline
+# scripts around #programs-table, one row per program with the name link, its degree in a nested span and the
+# college and degree-type columns, and a long footer after the table
+def catalog_page(programs, seed=2):
+    rng = random.Random(seed)
+    colleges = ["Arts and Sciences", "Business", "Education", "Fine and Applied Arts", "Health Sciences",
+                "Graduate School", "Honors College"]
+    head = [
+        '<!DOCTYPE html>\n<html lang="en">\n<head>\n<meta charset="utf-8">\n<title>All Programs | App State</title>',
+        *(f'<link rel="stylesheet" href="/_assets/css/site-{n}.css?v=20240101">' for n in range(12)),
+        '<script>window.dataLayer = window.dataLayer || [];'
+        + "".join(f'dataLayer.push({{"event": "load-{n}", "value": "{"x" * 40}"}});' for n in range(60))
+        + '</script>\n</head>\n<body class="page academics">\n<header id="site-header"><nav><ul>',
+        *(f'<li class="menu-item"><a href="/section-{n}/">Section {n} &amp; more</a>'
+          f'<ul class="submenu">{"".join(f"<li><a href=/section-{n}/{m}/>Item {m}</a></li>" for m in range(8))}'
+          '</ul></li>' for n in range(40)),
+        '</ul></nav></header>\n<main id="content"><h1>All Programs</h1>',
+        '<p>Explore more than 150 undergraduate majors &mdash; and graduate programs.</p>',
+        '<table id="programs-table" class="table table-striped">\n<thead><tr><th>Program</th><th>College</th>'
+        '<th>Degree</th></tr></thead>\n<tbody>',
+    ]
+    rows = []
+    for name, url in programs.items():
+        base, _, degree = name.partition(" (")
+        title = base.title().replace("'S", "'s").replace("&", "&amp;").replace("'", "&#39;")
+        if degree:
+            title += f' <span class="degree">({degree.upper()}</span>'
+        href = url if rng.random() < 0.2 else url.replace("https://www.appstate.edu", "")
+        rows.append(
+            f'<tr class="program-row">\n  <td>\n    <div class="program-name"><a href="{href}">{title}</a></div>\n'
+            f'    <div class="program-meta"><a href="{href}#requirements">Requirements</a></div>\n  </td>\n'
+            f'  <td>{rng.choice(colleges)}</td>\n  <td>{degree.strip(")").upper() or "Major"}</td>\n</tr>'
+        )
+    tail = [
+        '</tbody>\n</table>\n</main>\n<footer id="site-footer">',
+        *(f'<div class="footer-column"><h2>Column {n}</h2><ul>'
+          f'{"".join(f"<li><a href=/footer/{n}/{m}/>Footer link {m}</a></li>" for m in range(25))}</ul></div>'
+          for n in range(30)),
+        '</footer>\n<script src="/_assets/js/site.js?v=20240101"></script>\n</body>\n</html>\n',
+    ]
+    return "\n".join(head + rows + tail).encode()
@@ -0,0 +1,208 @@
+# Load generator for POST /generate_advice: runs a fixed number of requests at each concurrency level and
+# reports throughput and latency percentiles. Like a browser, each request follows the 303 to its advice
+# permalink, so the latency covers both.
+#
+# Fully offline: starts the fake Azure OpenAI and catalog servers and serves CareerAdvice.app in-process:
+#
+#     python -m benchmarks.loadgen --concurrency 1 8 32 --requests 200 --latency 0.8
+#
+# or with a real server started against the fake services ({port} and {config} are filled in):
+#
+#     python -m benchmarks.loadgen --server-cmd "gunicorn -w 4 --threads 8 -b 127.0.0.1:{port} CareerAdvice:app"
+#     python -m benchmarks.loadgen --server-cmd "uvicorn asgi:app --workers 2 --port {port}"
+#
+# or against an app that is already running (it must be configured for the fake or real services itself):
+#
+#     python -m benchmarks.loadgen --url http://127.0.0.1:8000
+#
+# Requests cycle through --distinct (major, interests) pairs, so everything after the first --distinct
+# requests is served from the advice cache; the default makes every request unique.
+#
+# --stream drives the progressive page's GET /generate_advice/stream instead, each request reading its events
+# up to done. "parallel" estimates how many requests the server worked on at once (requests times the fastest
+# latency, over the wall time): close to the concurrency level when it serves them concurrently, close to 1
+# when it serializes them, e.g.
+#
+#     python -m benchmarks.loadgen --stream --server-cmd "uvicorn asgi:app --port {port}" --concurrency 4 \
+#         --requests 8 --latency 1
+
+import argparse
+import logging
+import math
+import os
+import shlex
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+
+import requests
+
+from benchmarks import offline
+from benchmarks.fixtures import BASE_PROGRAMS
+
+INTERESTS = ["helping people", "working outdoors", "technology", "research", "teaching", "design", "travel",
+             "business", "writing", "healthcare"]
+
+
+# Form data of count distinct advice requests
+def advice_forms(count):
+    forms = []
+    for n in range(count):
+        interests = INTERESTS[n // len(BASE_PROGRAMS) % len(INTERESTS)]
+        repeat = n // (len(BASE_PROGRAMS) * len(INTERESTS))
+        if repeat:
+            interests += f" and hobby {repeat}"
+        forms.append({'major': BASE_PROGRAMS[n % len(BASE_PROGRAMS)], 'interests': interests})
+    return forms
+
+
+# Nearest-rank percentile of sorted values
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+# Read an advice event stream to its end; returns an error or None
+def read_stream(session, url, form):
+    with session.get(url, params=form, stream=True, timeout=300) as response:
+        if response.status_code != 200:
+            return f"HTTP {response.status_code}"
+        for line in response.iter_lines(decode_unicode=True):
+            if line == "event: done":
+                return None
+            if line == "event: error":
+                return "stream error"
+    return "stream incomplete"
+
+
+def run_level(url, concurrency, forms, path, stream=False):
+    latencies = []
+    errors = {}
+    lock = threading.Lock()
+    next_request = iter(range(len(forms)))
+
+    def worker():
+        session = requests.Session()
+        while True:
+            with lock:
+                number = next(next_request, None)
+            if number is None:
+                return
+            form = forms[number]
+            start = time.perf_counter()
+            try:
+                if stream:
+                    error = read_stream(session, url + path, form)
+                else:
+                    response = session.post(url + path, data=form, timeout=300)
+                    error = None if response.status_code == 200 else f"HTTP {response.status_code}"
+            except requests.RequestException as e:
+                error = type(e).__name__
+            elapsed = time.perf_counter() - start
+            with lock:
+                if error:
+                    errors[error] = errors.get(error, 0) + 1
+                else:
+                    latencies.append(elapsed)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"concurrency {concurrency:>4}  requests {len(forms):>5}  ok {len(latencies):>5}  "
+          f"rps {len(latencies) / wall:8.1f}  p50 {percentile(latencies, 0.5) * 1000:8.1f} ms  "
+          f"p95 {percentile(latencies, 0.95) * 1000:8.1f} ms  p99 {percentile(latencies, 0.99) * 1000:8.1f} ms  "
+          f"max {(latencies[-1] if latencies else float('nan')) * 1000:8.1f} ms  "
+          f"parallel {len(latencies) * (latencies[0] if latencies else 0.0) / wall:6.1f}"
+          + (f"  errors {errors}" if errors else ""))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(url + "/", timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise SystemExit(f"Server at {url} did not come up within {timeout} seconds.")
+
+
+def serve_in_process():
+    from werkzeug.serving import make_server
+    import CareerAdvice
+
+    server = make_server('127.0.0.1', 0, CareerAdvice.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="app-server", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive /generate_advice at fixed concurrency levels.")
+    parser.add_argument('--url', help="an already running app; the fake services are not started")
+    parser.add_argument('--server-cmd', help="command that starts the app on {port} with the config at {config}")
+    parser.add_argument('--path', help="default /generate_advice, or /generate_advice/stream with --stream")
+    parser.add_argument('--stream', action='store_true', help="GET the server-sent event stream instead of posting")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--requests', type=int, default=100, help="requests per concurrency level")
+    parser.add_argument('--distinct', type=int, help="distinct (major, interests) pairs, default all unique")
+    parser.add_argument('--warmup', type=int, default=0, help="requests sent before measuring")
+    offline.add_arguments(parser)
+    args = parser.parse_args()
+    path = args.path or ('/generate_advice/stream' if args.stream else '/generate_advice')
+
+    forms = advice_forms(args.distinct or (args.requests * len(args.concurrency) + args.warmup))
+    services = process = None
+    url = args.url
+    if url is None:
+        workdir = tempfile.mkdtemp(prefix="careeradvice-loadgen-")
+        services = offline.start(args, workdir)
+        print(f"Fake Azure OpenAI at {services.azure.url}, catalog at {services.catalog.url}")
+        if args.server_cmd:
+            port = free_port()
+            command = args.server_cmd.format(port=port, config=services.config_path)
+            process = subprocess.Popen(shlex.split(command), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                       env={**os.environ, 'CAREERADVICE_CONFIG': services.config_path})
+            url = f"http://127.0.0.1:{port}"
+            wait_until_up(url)
+        else:
+            services.set_config()
+            logging.disable(logging.INFO)
+            url = serve_in_process()
+
+    try:
+        if args.warmup:
+            print("warmup:")
+            run_level(url, max(args.concurrency), [forms[n % len(forms)] for n in range(args.warmup)], path,
+                      args.stream)
+        offset = args.warmup
+        for concurrency in args.concurrency:
+            run_level(url, concurrency, [forms[(offset + n) % len(forms)] for n in range(args.requests)], path,
+                      args.stream)
+            offset += args.requests
+        if services:
+            print(f"Fake Azure OpenAI: {services.azure.stats}")
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+        if services:
+            services.shutdown()
+
+
+if __name__ == '__main__':
+    main()
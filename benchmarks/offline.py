@@ -0,0 +1,45 @@
+# Offline stand-ins for every external service the app talks to: a fake Azure OpenAI endpoint, a fake
+# academics page, and a config file pointing the app at both. CareerAdvice reads the file named by
+# CAREERADVICE_CONFIG, so set_config() has to run before CareerAdvice is imported.
+
+import json
+import os
+
+from benchmarks import fake_azure, fake_catalog
+
+
+class OfflineServices:
+    def __init__(self, workdir, programs=300, config=None, **azure_options):
+        self.azure = fake_azure.serve(**azure_options)
+        self.catalog = fake_catalog.serve(programs=programs)
+        self.config = {
+            'azure_openai_api_key': "offline-benchmark",
+            'azure_endpoint': self.azure.url,
+            'api_version': "2024-03-01-preview",
+            'programs_url': self.catalog.url,
+            'catalog_snapshot_path': os.path.join(workdir, 'programs_snapshot.json'),
+            'cache_path': os.path.join(workdir, 'response_cache.sqlite3'),
+            **(config or {}),
+        }
+        self.config_path = os.path.join(workdir, 'config.json')
+        with open(self.config_path, 'w') as config_file:
+            json.dump(self.config, config_file, indent=4)
+
+    def set_config(self):
+        os.environ['CAREERADVICE_CONFIG'] = self.config_path
+
+    def shutdown(self):
+        self.azure.shutdown()
+        self.catalog.shutdown()
+
+
+# The --cache and fake server options shared by the benchmarks that run the whole app
+def add_arguments(parser):
+    parser.add_argument('--programs', type=int, default=300, help="programs on the fake academics page")
+    parser.add_argument('--cache', choices=['memory', 'sqlite'], default='memory')
+    fake_azure.add_arguments(parser)
+
+
+def start(args, workdir, config=None):
+    return OfflineServices(workdir, programs=args.programs, config={'cache_backend': args.cache, **(config or {})},
+                           **fake_azure.server_options(args))
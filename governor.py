@@ -0,0 +1,309 @@
+import asyncio
+import contextvars
+import email.utils
+import logging
+import random
+import threading
+import time
+
+from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+
+from metrics import registry
+
+# Errors worth retrying: throttling, timeouts, dropped connections and 5xx responses
+RETRYABLE_ERRORS = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
+
+throttled = registry.counter(
+    'careeradvice_governor_throttled_total', "Chat completions delayed by the client-side rate limiter.", ['limit'])
+throttle_seconds = registry.counter(
+    'careeradvice_governor_throttle_seconds_total', "Time chat completions waited for the rate limiter.")
+retries = registry.counter(
+    'careeradvice_llm_retries_total', "Chat completion attempts retried after an error.", ['kind', 'reason'])
+breaker_trips = registry.counter(
+    'careeradvice_circuit_breaker_trips_total', "Times the circuit breaker opened.")
+breaker_rejections = registry.counter(
+    'careeradvice_circuit_breaker_rejections_total', "Chat completions refused while the breaker was open.", ['kind'])
+degraded_responses = registry.counter(
+    'careeradvice_degraded_responses_total', "Results served from stale cache or the local index instead of the LLM.",
+    ['kind', 'source'])
+
+# The degraded results served for the request being handled, as (kind, source) pairs, so responses built from
+# them are not cached; None outside a request
+degraded_results = contextvars.ContextVar('degraded_results', default=None)
+
+
+# The LLM cannot be used right now: the breaker is open or every retry failed. retry_after is a hint in seconds.
+class LLMUnavailable(Exception):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# Token bucket refilled continuously at per_minute / 60 per second. It holds at most ten seconds of quota, since
+# Azure enforces its per-minute quotas over short windows and rejects a whole minute's worth sent in one burst.
+# reserve() always succeeds and returns how long the caller must wait before using what it took, so sync
+# and async callers can share one bucket.
+class TokenBucket:
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = per_minute / 6.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= min(amount, self.capacity)
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+
+# Opens after failure_threshold consecutive failed attempts and refuses calls for cooldown seconds. It then lets
+# a single probe through (half-open): a success closes it again, a failure reopens it. Rate limited responses
+# do not count: the endpoint is up, only busy.
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, cooldown=30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return 'closed'
+            return 'open' if time.monotonic() - self.opened_at < self.cooldown or self.probing else 'half-open'
+
+    # Returns (wait, probe): wait is None when the call may go ahead, otherwise the seconds until the breaker lets
+    # a probe through; probe is True for the one call let through as the half-open probe
+    def check(self):
+        with self._lock:
+            if self.opened_at is None:
+                return None, False
+            remaining = self.cooldown - (time.monotonic() - self.opened_at)
+            if remaining > 0 or self.probing:
+                return max(remaining, 1.0), False
+            self.probing = True
+            return None, True
+
+    def succeed(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    # A rate limited attempt neither counts towards nor resets the failures, but it answers a half-open probe
+    def throttled(self):
+        with self._lock:
+            if self.probing:
+                self.failures = 0
+                self.opened_at = None
+                self.probing = False
+
+    def fail(self):
+        with self._lock:
+            self.failures += 1
+            if self.probing or (self.opened_at is None and self.failures >= self.failure_threshold):
+                if self.opened_at is None:
+                    breaker_trips.inc()
+                    logging.warning("Circuit breaker opened after %s failed chat completions.", self.failures)
+                self.opened_at = time.monotonic()
+                self.probing = False
+
+
+def record_degraded(kind, source):
+    degraded_responses.inc(kind=kind, source=source)
+    results = degraded_results.get()
+    if results is not None:
+        results.append((kind, source))
+
+
+# Retry-After of a rate limited response, in seconds (Azure also sends retry-after-ms)
+def retry_after(error):
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    try:
+        if response.headers.get('retry-after-ms'):
+            return float(response.headers['retry-after-ms']) / 1000
+        value = response.headers.get('retry-after')
+        if value is None:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_reason(error):
+    if isinstance(error, RateLimitError):
+        return 'rate_limit'
+    if isinstance(error, APITimeoutError):
+        return 'timeout'
+    if isinstance(error, APIConnectionError):
+        return 'connection'
+    return 'server_error'
+
+
+# What Azure counts against the TPM quota when admitting a request: the prompt plus max_tokens
+def estimate_tokens(kwargs):
+    prompt_chars = sum(len(message.get('content') or "") for message in kwargs.get('messages', []))
+    return prompt_chars // 4 + kwargs.get('max_tokens', 0)
+
+
+# Shared request governor for chat completions: paces calls to the deployment's RPM/TPM quota, retries
+# retryable errors with jittered exponential backoff (honouring Retry-After), and trips a circuit breaker
+# when the endpoint keeps failing so callers can degrade instead of piling on more retries. A call gives up
+# with LLMUnavailable instead of waiting past deadline seconds from its start, which must stay well under the
+# worker timeout (see Procfile) so a long Retry-After ends in a 503 rather than a killed worker.
+class RateGovernor:
+    def __init__(self, requests_per_minute=0, tokens_per_minute=0, max_retries=4, base_delay=0.5, max_delay=30.0,
+                 breaker=None, deadline=20.0):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.breaker = breaker or CircuitBreaker()
+
+    # Raises LLMUnavailable while the breaker is open; returns True when the call is the half-open probe
+    def admit(self, kind):
+        wait, probe = self.breaker.check()
+        if wait is not None:
+            breaker_rejections.inc(kind=kind)
+            raise LLMUnavailable("The chat completion circuit breaker is open.", wait)
+        return probe
+
+    # Seconds to wait before sending a request of this size
+    def pace(self, kwargs):
+        waits = []
+        if self.requests:
+            waits.append(('rpm', self.requests.reserve(1)))
+        if self.tokens:
+            waits.append(('tpm', self.tokens.reserve(estimate_tokens(kwargs))))
+        wait = max((seconds for _, seconds in waits), default=0.0)
+        if wait > 0:
+            throttled.inc(limit=max(waits, key=lambda item: item[1])[0])
+            throttle_seconds.inc(wait)
+        return wait
+
+    # Whether waiting wait seconds more would take a call past its deadline (0 disables the deadline)
+    def past_deadline(self, wait, deadline_at):
+        return bool(self.deadline) and time.monotonic() + wait > deadline_at
+
+    # Seconds the rate limiter makes the call wait, or raise when that would pass its deadline
+    def paced(self, kwargs, deadline_at):
+        wait = self.pace(kwargs)
+        if self.past_deadline(wait, deadline_at):
+            raise LLMUnavailable(f"The rate limiter would delay the chat completion {wait:.1f}s, past its deadline.",
+                                 wait)
+        return wait
+
+    # Seconds to back off after a failed attempt, or raise when the call should give up
+    def backoff(self, kind, error, attempt, deadline_at):
+        if isinstance(error, RateLimitError):
+            self.breaker.throttled()
+        else:
+            self.breaker.fail()
+        if attempt >= self.max_retries:
+            raise LLMUnavailable(f"Chat completion failed after {attempt + 1} attempts: {error}",
+                                 retry_after(error)) from error
+        delay = retry_after(error)
+        if delay is None:
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        delay = min(delay, self.max_delay)
+        if self.past_deadline(delay, deadline_at):
+            raise LLMUnavailable(f"Chat completion failed and a retry in {delay:.1f}s would pass its deadline: {error}",
+                                 delay) from error
+        retries.inc(kind=kind, reason=retry_reason(error))
+        logging.warning("Chat completion failed (%s), retrying in %.1fs.", retry_reason(error), delay)
+        return delay
+
+    # An attempt that ended without an answer (cancelled, interrupted) says nothing about the endpoint, but a
+    # half-open probe must still be released or the breaker would refuse every call from then on
+    def abandon(self, probe):
+        if probe:
+            self.breaker.fail()
+
+    def call(self, kind, fn, **kwargs):
+        attempt = 0
+        deadline_at = time.monotonic() + self.deadline
+        while True:
+            probe = self.admit(kind)
+            try:
+                wait = self.paced(kwargs, deadline_at)
+                if wait:
+                    time.sleep(wait)
+                result = fn(**kwargs)
+            except RETRYABLE_ERRORS as e:
+                time.sleep(self.backoff(kind, e, attempt, deadline_at))
+                attempt += 1
+                continue
+            except LLMUnavailable:
+                self.abandon(probe)
+                raise
+            except Exception:
+                # Anything else (a bad request, ...) still means the endpoint answered
+                self.breaker.succeed()
+                raise
+            except BaseException:
+                self.abandon(probe)
+                raise
+            self.breaker.succeed()
+            return result
+
+    async def call_async(self, kind, fn, **kwargs):
+        attempt = 0
+        deadline_at = time.monotonic() + self.deadline
+        while True:
+            probe = self.admit(kind)
+            try:
+                wait = self.paced(kwargs, deadline_at)
+                if wait:
+                    await asyncio.sleep(wait)
+                result = await fn(**kwargs)
+            except RETRYABLE_ERRORS as e:
+                await asyncio.sleep(self.backoff(kind, e, attempt, deadline_at))
+                attempt += 1
+                continue
+            except LLMUnavailable:
+                self.abandon(probe)
+                raise
+            except Exception:
+                # Anything else (a bad request, ...) still means the endpoint answered
+                self.breaker.succeed()
+                raise
+            except BaseException:
+                self.abandon(probe)
+                raise
+            self.breaker.succeed()
+            return result
+
+
+def breaker_state(governor):
+    return {'closed': 0, 'half-open': 0.5, 'open': 1}[governor.breaker.state]
+
+
+# Build the governor described by the llm_* and circuit_breaker_* settings in config.json. The quotas are per
+# process, so with several gunicorn workers divide the deployment's quota between them.
+def create_governor(config):
+    governor = RateGovernor(
+        requests_per_minute=config.get('llm_requests_per_minute', 0),
+        tokens_per_minute=config.get('llm_tokens_per_minute', 0),
+        max_retries=config.get('llm_max_retries', 4),
+        deadline=config.get('llm_retry_deadline_seconds', 20),
+        breaker=CircuitBreaker(config.get('circuit_breaker_failures', 5),
+                               config.get('circuit_breaker_cooldown_seconds', 30))
+    )
+    registry.collect('careeradvice_circuit_breaker_state', 'gauge',
+                     "Chat completion circuit breaker: 0 closed, 0.5 half-open, 1 open.",
+                     lambda: [({}, breaker_state(governor))])
+    return governor
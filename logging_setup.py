@@ -0,0 +1,135 @@
+import atexit
+import json
+import logging
+import queue
+import random
+import re
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from metrics import registry
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# The id of the request being handled, set from X-Request-ID (or generated) by the web entry points and copied
+# into every record logged while handling it
+request_id = ContextVar('request_id', default='-')
+
+dropped_records = registry.counter(
+    'careeradvice_log_records_dropped_total', "Log records dropped by sampling, rate limits or a full log queue.",
+    ['reason'])
+
+
+# The client's X-Request-ID when it is a sane token, otherwise a fresh one
+def new_request_id(header=None):
+    if header and re.fullmatch(r"[A-Za-z0-9._:-]{1,64}", header):
+        return header
+    return uuid.uuid4().hex
+
+
+# Streamed responses are iterated after the request hooks have run, so they carry the request id themselves
+def with_request_id(events, value):
+    request_id.set(value)
+    try:
+        yield from events
+    finally:
+        request_id.set('-')
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = request_id.get()
+        return True
+
+
+# Thins out high-volume DEBUG/INFO events; warnings and errors always pass. An event is a call site's message
+# template, e.g. "Matching profession: %s", so sample_rates can be keyed by template or by function name
+# ({"infer_program_url": 0.1}). Each event is also capped at max_per_second records.
+class HotPathFilter(logging.Filter):
+    def __init__(self, sample_rates=None, max_per_second=0):
+        super().__init__()
+        self.sample_rates = sample_rates or {}
+        self.max_per_second = max_per_second
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        event = str(record.msg)
+        rate = self.sample_rates.get(event, self.sample_rates.get(record.funcName, 1.0))
+        if rate < 1.0 and random.random() >= rate:
+            dropped_records.inc(reason='sampled')
+            return False
+        if self.max_per_second:
+            second = int(time.monotonic())
+            with self._lock:
+                window, count = self._windows.get(event, (second, 0))
+                if window != second:
+                    window, count = second, 0
+                self._windows[event] = (window, count + 1)
+            if count >= self.max_per_second:
+                dropped_records.inc(reason='rate_limited')
+                return False
+        return True
+
+
+# One JSON object per line. The message is only %-formatted here, on the listener thread.
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'request_id': getattr(record, 'request_id', '-'),
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+# Hands records to the listener without formatting them (the stock QueueHandler formats on the caller's thread)
+# and drops them instead of blocking when the queue is full. Arguments are formatted later, so log values,
+# not objects the caller goes on to mutate.
+class NonBlockingQueueHandler(QueueHandler):
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            dropped_records.inc(reason='queue_full')
+
+
+# Set up logging from the log_* settings in config.json. The default development mode keeps the plain text
+# DEBUG log on stderr; log_mode "production" writes JSON lines with request ids from a background thread,
+# with sampling and per-event rate limits for DEBUG/INFO records.
+def configure_logging(config):
+    if config.get('log_mode', 'development') != 'production':
+        logging.basicConfig(level=config.get('log_level', 'DEBUG'), format=TEXT_FORMAT)
+        return None
+
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter())
+    log_queue = queue.Queue(int(config.get('log_queue_size', 10000)))
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(RequestIdFilter())
+    queue_handler.addFilter(HotPathFilter(config.get('log_sample_rates', {}),
+                                          int(config.get('log_max_per_second', 20))))
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(queue_handler)
+    root.setLevel(config.get('log_level', 'INFO'))
+
+    listener = QueueListener(log_queue, handler)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,200 @@
+import contextvars
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets, from in-process parsing up to slow completions
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0,
+                   40.0, 60.0)
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+
+def format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# A counter split by label values, e.g. llm_tokens_total{kind="advice",type="prompt"}
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        return [(self.name, dict(zip(self.labelnames, key)), value) for key, value in sorted(values.items())]
+
+
+# A cumulative histogram in the Prometheus layout: per-bucket counts plus _sum and _count
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for position, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[position] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        samples = []
+        for key, (counts, total) in sorted(values.items()):
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", {**labels, 'le': format_value(bound)}, cumulative))
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, cumulative))
+        return samples
+
+
+# Metrics computed when /metrics is scraped from stats the rest of the app already keeps (cache, single
+# flights, shortlist, catalog); fn returns [(labels, value)]
+class Collected:
+    def __init__(self, name, type, help, fn):
+        self.name = name
+        self.type = type
+        self.help = help
+        self.fn = fn
+
+    def samples(self):
+        return [(self.name, labels, value) for labels, value in self.fn()]
+
+
+# The metrics of this process. Every gunicorn worker keeps its own registry, so the scraper sums workers.
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def collect(self, name, type, help, fn):
+        return self.register(Collected(name, type, help, fn))
+
+    # Prometheus text exposition format (version 0.0.4)
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+stage_seconds = registry.histogram(
+    'careeradvice_stage_seconds', "Time spent in each stage of serving advice.", ['stage'])
+llm_tokens = registry.counter(
+    'careeradvice_llm_tokens_total', "Tokens used by chat completions.", ['kind', 'type'])
+llm_streams = registry.counter(
+    'careeradvice_llm_streams_total', "Streamed chat completions, by whether they reported their token usage.",
+    ['kind', 'usage'])
+llm_errors = registry.counter(
+    'careeradvice_llm_errors_total', "Chat completions that raised an error.", ['kind'])
+program_url_fallbacks = registry.counter(
+    'careeradvice_program_url_fallbacks_total', "Professions answered with the default academics URL.", ['reason'])
+
+# Stage durations of the request being served, for the Server-Timing header; None outside of a request or
+# when timing headers are off
+request_timings = contextvars.ContextVar('request_timings', default=None)
+
+
+# Time the block as stage, e.g. `with timed('advice_llm'):`
+@contextmanager
+def timed(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+
+def observe(stage, seconds):
+    stage_seconds.observe(seconds, stage=stage)
+    timings = request_timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+
+# Count the tokens of a chat completion; kind is 'advice' or 'inference'
+def record_usage(kind, response):
+    usage = getattr(response, 'usage', None)
+    if usage is None:
+        return
+    llm_tokens.inc(usage.prompt_tokens or 0, kind=kind, type='prompt')
+    llm_tokens.inc(usage.completion_tokens or 0, kind=kind, type='completion')
+
+
+# Start collecting the stage timings of a request; pass the token to finish_request_timings
+def start_request_timings():
+    return request_timings.set([])
+
+
+# Returns the Server-Timing header value for the stages recorded since start_request_timings, one entry per
+# stage with the summed duration (stages that ran concurrently are summed too) and the number of calls
+def finish_request_timings(token, total=None):
+    timings = request_timings.get() or []
+    request_timings.reset(token)
+    stages = {}
+    for stage, seconds in timings:
+        duration, count = stages.get(stage, (0.0, 0))
+        stages[stage] = (duration + seconds, count + 1)
+    entries = [f'{stage};dur={duration * 1000:.1f}' + (f';desc="{count} calls"' if count > 1 else "")
+               for stage, (duration, count) in stages.items()]
+    if total is not None:
+        entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+# Wrap fn so that, run on a worker thread, it sees the context variables of the request that submitted it: its
+# stage timings, request id, ... (thread pools do not carry context variables over). Each call runs in its own
+# copy, since one context cannot be entered by several threads at once.
+def in_request_context(fn):
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+    return run
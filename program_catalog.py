@@ -0,0 +1,390 @@
+import argparse
+import codecs
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from html.parser import HTMLParser
+
+import requests
+
+from metrics import timed
+from program_index import ProgramIndex
+from program_matcher import ProgramMatcher
+
+PROGRAMS_URL = "https://www.appstate.edu/academics/all/"
+SNAPSHOT_FORMAT = 1
+
+
+# Streaming parser for the academics page. It only tracks the state it needs inside #programs-table
+# (row -> first cell -> div.program-name -> first link) instead of building a tree of the whole document,
+# and sets done once the table closes so the rest of the page never has to be read. For each row it keeps
+# what the BeautifulSoup version did: the first <td>, its first div.program-name and that div's first <a>,
+# named by the link's stripped text (get_text(strip=True)).
+class ProgramTableParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.programs = {}
+        self.done = False
+        self._table_depth = 0
+        self._in_row = False
+        self._cell_seen = False
+        self._cell_depth = 0
+        self._div_seen = False
+        self._div_depth = 0
+        self._link_seen = False
+        self._link_href = None
+        self._link_text = None
+        self._text_node = []
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if self._link_text is not None:
+            self._end_text_node()
+        if tag == 'table':
+            if self._table_depth:
+                self._table_depth += 1
+            elif dict(attrs).get('id') == 'programs-table':
+                self._table_depth = 1
+            return
+        if not self._table_depth:
+            return
+
+        if tag == 'tr':
+            self._in_row = True
+            self._cell_seen = self._div_seen = self._link_seen = False
+        elif tag == 'td':
+            if self._cell_depth:
+                self._cell_depth += 1
+            elif self._in_row and not self._cell_seen:
+                self._cell_seen = True
+                self._cell_depth = 1
+        elif tag == 'div' and self._cell_depth:
+            if self._div_depth:
+                self._div_depth += 1
+            elif not self._div_seen and 'program-name' in (dict(attrs).get('class') or '').split():
+                self._div_seen = True
+                self._div_depth = 1
+        elif tag == 'a' and self._div_depth and not self._link_seen:
+            self._link_seen = True
+            self._link_href = dict(attrs).get('href')
+            self._link_text = []
+
+    def handle_endtag(self, tag):
+        if self.done or not self._table_depth:
+            return
+        if self._link_text is not None:
+            self._end_text_node()
+        if tag == 'table':
+            self._table_depth -= 1
+            if not self._table_depth:
+                self.done = True
+        elif tag == 'tr':
+            self._in_row = False
+        elif tag == 'td' and self._cell_depth:
+            self._cell_depth -= 1
+            if not self._cell_depth:
+                self._div_depth = 0
+        elif tag == 'div' and self._div_depth:
+            self._div_depth -= 1
+        elif tag == 'a' and self._link_text is not None:
+            self._add_program()
+
+    # The tokenizer may hand one text node over in several pieces, so strip the node once it ends
+    def handle_data(self, data):
+        if self._link_text is not None:
+            self._text_node.append(data)
+
+    def handle_comment(self, data):
+        if self._link_text is not None:
+            self._end_text_node()
+
+    def _end_text_node(self):
+        stripped = "".join(self._text_node).strip()
+        if stripped:
+            self._link_text.append(stripped)
+        self._text_node = []
+
+    def _add_program(self):
+        self._end_text_node()
+        program_name = "".join(self._link_text).lower()
+        if self._link_href is not None:
+            self.programs[program_name] = program_url(self._link_href)
+        self._link_href = self._link_text = None
+
+
+def program_url(href):
+    if href.startswith('http'):
+        return href
+    return f"https://www.appstate.edu{href}"
+
+
+# Parse the {name: url} catalog out of the academics page. chunks is an iterable of byte (or str) chunks,
+# e.g. response.iter_content(); reading stops as soon as the programs table has been parsed.
+def parse_program_chunks(chunks, encoding='utf-8'):
+    parser = ProgramTableParser()
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    for chunk in chunks:
+        parser.feed(decoder.decode(chunk) if isinstance(chunk, bytes) else chunk)
+        if parser.done:
+            break
+    else:
+        parser.feed(decoder.decode(b"", final=True))
+        parser.close()
+    if parser._link_text is not None:
+        parser._add_program()
+    return parser.programs
+
+
+def parse_programs(content, encoding='utf-8'):
+    return parse_program_chunks([content], encoding)
+
+
+# The charset the server declared, or UTF-8 (what the page is served as) instead of requests' ISO-8859-1
+# fallback for text/html without one
+def response_encoding(response):
+    if 'charset' in response.headers.get('Content-Type', '').lower():
+        return response.encoding
+    return 'utf-8'
+
+
+def read_programs(response, chunk_size=64 * 1024):
+    try:
+        return parse_program_chunks(response.iter_content(chunk_size), response_encoding(response))
+    finally:
+        response.close()
+
+
+# Fetch the list of programs from the university's academic page
+def fetch_programs(url=PROGRAMS_URL):
+    try:
+        logging.debug("Fetching programs from Appalachian State University website.")
+        with timed('catalog_fetch'):
+            response = requests.get(url, stream=True, timeout=30)
+        with timed('catalog_parse'):
+            programs = read_programs(response)
+
+        if not programs:
+            logging.warning("No programs were fetched from the website. Please check the URL and parsing logic.")
+        else:
+            logging.debug("Fetched %s programs.", len(programs))
+
+        return programs
+
+    except Exception as e:
+        logging.error("Error occurred while fetching programs: %s", e)
+        return {}
+
+
+# The program a catalog entry belongs to, without its degree and concentration: "biology (b.s.)",
+# "biology minor" and "biology - ecology (b.s.)" are all "biology"
+def program_base_name(name):
+    base = re.sub(r"\s*\(.*?\)", "", name).split(" - ")[0]
+    return re.sub(r"\s+(minor|certificate)$", "", base.strip()) or name
+
+
+def catalog_version(programs):
+    return hashlib.sha256(json.dumps(sorted(programs.items())).encode()).hexdigest()[:16]
+
+
+# One immutable version of the catalog together with the match indexes built from it. Requests hold on to
+# the snapshot they started with, so a refresh never changes the catalog underneath a running lookup.
+class CatalogSnapshot:
+    def __init__(self, programs, etag=None, last_modified=None, fetched_at=None, checked_at=None):
+        self.programs = programs
+        self.names = list(programs)
+        self.base_names = {name: program_base_name(name) for name in self.names}
+        self.base_count = len(set(self.base_names.values()))
+        self.index = ProgramIndex(programs)
+        self.matcher = ProgramMatcher(self.names)
+        self.version = catalog_version(programs)
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at
+        self.checked_at = checked_at
+
+    def to_json(self):
+        return {'format': SNAPSHOT_FORMAT, 'version': self.version, 'etag': self.etag,
+                'last_modified': self.last_modified, 'fetched_at': self.fetched_at, 'checked_at': self.checked_at,
+                'programs': self.programs}
+
+
+# The program catalog, persisted as a JSON snapshot so workers start without touching the network, and kept
+# fresh by a background thread that revalidates the page with conditional GETs (ETag / If-Modified-Since).
+# A worker that finds a newer snapshot written by another worker loads it instead of fetching the page.
+class ProgramCatalog:
+    def __init__(self, url=PROGRAMS_URL, snapshot_path='programs_snapshot.json', refresh_interval=6 * 60 * 60):
+        self.url = url
+        self.snapshot_path = snapshot_path
+        self.refresh_interval = refresh_interval
+        self.current = CatalogSnapshot({})
+        self._refresh_lock = threading.Lock()
+        self._snapshot_mtime = None
+        self._thread = None
+
+    # Start from the snapshot on disk, fetching the page only when there is none yet
+    def load(self):
+        if not self.load_snapshot():
+            self.refresh()
+        return self.current
+
+    def load_snapshot(self):
+        try:
+            mtime = os.path.getmtime(self.snapshot_path)
+            with open(self.snapshot_path, 'r') as snapshot_file:
+                data = json.load(snapshot_file)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            logging.error("Error occurred while reading the program catalog snapshot: %s", e)
+            return False
+        if data.get('format') != SNAPSHOT_FORMAT or not data.get('programs'):
+            logging.warning("Ignoring unusable program catalog snapshot %s.", self.snapshot_path)
+            return False
+
+        self._snapshot_mtime = mtime
+        if data.get('version') == self.current.version:
+            self.current.checked_at = data.get('checked_at')
+            return True
+        self._swap(CatalogSnapshot(data['programs'], data.get('etag'), data.get('last_modified'),
+                                   data.get('fetched_at'), data.get('checked_at')))
+        logging.info("Loaded %s programs from snapshot %s.", len(self.current.names), self.current.version)
+        return True
+
+    def save_snapshot(self, snapshot):
+        temporary_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+        try:
+            with open(temporary_path, 'w') as snapshot_file:
+                json.dump(snapshot.to_json(), snapshot_file, indent=1)
+            os.replace(temporary_path, self.snapshot_path)
+            self._snapshot_mtime = os.path.getmtime(self.snapshot_path)
+        except OSError as e:
+            logging.error("Error occurred while saving the program catalog snapshot: %s", e)
+
+    # Revalidate the catalog page; returns True when a new catalog was swapped in
+    def refresh(self):
+        with self._refresh_lock:
+            current = self.current
+            headers = {}
+            if current.programs and current.etag:
+                headers['If-None-Match'] = current.etag
+            if current.programs and current.last_modified:
+                headers['If-Modified-Since'] = current.last_modified
+
+            try:
+                logging.debug("Fetching programs from Appalachian State University website.")
+                with timed('catalog_fetch'):
+                    response = requests.get(self.url, headers=headers, timeout=30, stream=True)
+                now = time.time()
+                if response.status_code == 304:
+                    response.close()
+                    logging.debug("Program catalog is unchanged.")
+                    current.checked_at = now
+                    self.save_snapshot(current)
+                    return False
+                if not response.ok:
+                    response.close()
+                    response.raise_for_status()
+                # The body is streamed, so catalog_fetch covers the headers and catalog_parse the download
+                with timed('catalog_parse'):
+                    programs = read_programs(response)
+            except Exception as e:
+                logging.error("Error occurred while fetching programs: %s", e)
+                return False
+
+            if not programs:
+                logging.warning("No programs were fetched from the website. Please check the URL and parsing logic.")
+                return False
+
+            with timed('catalog_index'):
+                snapshot = CatalogSnapshot(programs, response.headers.get('ETag'),
+                                           response.headers.get('Last-Modified'), now, now)
+            changed = snapshot.version != current.version
+            if changed:
+                self._swap(snapshot)
+                logging.info("Program catalog updated to %s with %s programs.", snapshot.version, len(snapshot.names))
+            else:
+                current.etag, current.last_modified = snapshot.etag, snapshot.last_modified
+                current.fetched_at, current.checked_at = now, now
+                snapshot = current
+            self.save_snapshot(snapshot)
+            return changed
+
+    # Swapping the reference is atomic, so readers see either the old or the new snapshot in full
+    def _swap(self, snapshot):
+        self.current = snapshot
+
+    def _stale(self):
+        checked_at = self.current.checked_at or 0
+        retry_after = self.refresh_interval if self.current.programs else min(self.refresh_interval, 60)
+        return time.time() - checked_at >= retry_after
+
+    def _snapshot_changed(self):
+        try:
+            return os.path.getmtime(self.snapshot_path) != self._snapshot_mtime
+        except OSError:
+            return False
+
+    def _refresh_loop(self, poll_interval):
+        while True:
+            time.sleep(poll_interval * random.uniform(0.8, 1.2))
+            try:
+                if self._snapshot_changed():
+                    self.load_snapshot()
+                if self._stale():
+                    self.refresh()
+            except Exception as e:
+                logging.error("Error occurred while refreshing the program catalog: %s", e)
+
+    def start_background_refresh(self, poll_interval=60):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._refresh_loop, args=(min(poll_interval, self.refresh_interval),),
+                                            name="catalog-refresh", daemon=True)
+            self._thread.start()
+        return self._thread
+
+
+# Build the catalog described by the catalog_* settings in config.json
+def create_catalog(config):
+    return ProgramCatalog(
+        url=config.get('programs_url', PROGRAMS_URL),
+        snapshot_path=config.get('catalog_snapshot_path', 'programs_snapshot.json'),
+        refresh_interval=config.get('catalog_refresh_seconds', 6 * 60 * 60)
+    )
+
+
+# Manual refresh, e.g. from a deploy script or cron:
+#
+#     python program_catalog.py refresh
+#     python program_catalog.py show
+def main():
+    parser = argparse.ArgumentParser(description="Manage the persisted program catalog snapshot.")
+    parser.add_argument('command', choices=['refresh', 'show'])
+    parser.add_argument('--config', default='config.json')
+    parser.add_argument('--force', action='store_true', help="fetch the whole page, ignoring ETag/Last-Modified")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    try:
+        with open(args.config, 'r') as config_file:
+            config = json.load(config_file)
+    except FileNotFoundError:
+        config = {}
+
+    catalog = create_catalog(config)
+    catalog.load_snapshot()
+    if args.command == 'refresh':
+        if args.force:
+            catalog.current.etag = catalog.current.last_modified = None
+        changed = catalog.refresh()
+        print(f"{'Updated' if changed else 'Unchanged'}: ", end="")
+    print(f"{len(catalog.current.names)} programs, version {catalog.current.version}, snapshot {catalog.snapshot_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+import math
+import re
+from collections import Counter
+from urllib.parse import urlparse
+
+import numpy as np
+
+NGRAM_SIZES = (3, 4)
+
+
+# Character n-grams of every word, padded so that word starts and ends get their own grams
+def char_ngrams(text):
+    grams = Counter()
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        padded = f" {word} "
+        for size in NGRAM_SIZES:
+            for start in range(max(1, len(padded) - size + 1)):
+                grams[padded[start:start + size]] += 1
+    return grams
+
+
+# Turn the last path segment of a program URL into words, e.g. .../id/computer-science/ -> "computer science"
+def url_slug(url):
+    segments = [segment for segment in urlparse(url).path.split('/') if segment]
+    return segments[-1].replace('-', ' ').replace('_', ' ') if segments else ""
+
+
+# TF-IDF index over character n-grams of program names and URL slugs. Built once per catalog, it answers
+# nearest-program queries locally so the LLM is only needed when the best cosine score is too low.
+class ProgramIndex:
+    def __init__(self, programs):
+        self.names = list(programs)
+        documents = [char_ngrams(f"{name} {url_slug(url)}") for name, url in programs.items()]
+
+        document_frequency = Counter()
+        for grams in documents:
+            document_frequency.update(grams.keys())
+        self.vocabulary = {gram: column for column, gram in enumerate(document_frequency)}
+        self._unseen_idf = math.log(len(documents) + 1) + 1
+        self.idf = np.array(
+            [math.log((len(documents) + 1) / (document_frequency[gram] + 1)) + 1 for gram in self.vocabulary],
+            dtype=np.float32
+        )
+
+        # Stored vocabulary x programs so a query only has to gather the rows of its own n-grams
+        self.matrix = np.zeros((len(self.vocabulary), len(documents)), dtype=np.float32)
+        for column, grams in enumerate(documents):
+            rows = [self.vocabulary[gram] for gram in grams]
+            self.matrix[rows, column] = np.fromiter(grams.values(), dtype=np.float32, count=len(grams))
+        self.matrix *= self.idf[:, np.newaxis]
+        norms = np.linalg.norm(self.matrix, axis=0)
+        self.matrix /= np.where(norms > 0, norms, 1)
+
+    def __len__(self):
+        return len(self.names)
+
+    # Sparse TF-IDF vector of a query: vocabulary rows, their weights and the vector norm. N-grams that do not
+    # occur in the catalog still count towards the norm so unrelated text scores low.
+    def _vectorize(self, text):
+        grams = char_ngrams(text)
+        rows, counts = [], []
+        unseen = 0.0
+        for gram, count in grams.items():
+            row = self.vocabulary.get(gram)
+            if row is None:
+                unseen += (count * self._unseen_idf) ** 2
+            else:
+                rows.append(row)
+                counts.append(count)
+        weights = np.array(counts, dtype=np.float32) * self.idf[rows]
+        norm = math.sqrt(float(weights @ weights) + unseen)
+        return rows, weights, norm
+
+    def _top(self, scores, k):
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(self.names[i], float(scores[i])) for i in top]
+
+    # The k most similar programs as (name, cosine score) pairs, best first
+    def query(self, text, k=1):
+        if not self.names:
+            return []
+        rows, weights, norm = self._vectorize(text)
+        if not rows:
+            return self._top(np.zeros(len(self.names), dtype=np.float32), k)
+        scores = weights @ self.matrix[rows] / norm
+        return self._top(scores, k)
+
+    # Vectorized query() for several texts at once: one product over the union of their n-gram rows
+    def query_many(self, texts, k=1):
+        if not self.names:
+            return [[] for _ in texts]
+        vectors = [self._vectorize(text) for text in texts]
+        union = sorted({row for rows, _, _ in vectors for row in rows})
+        if not union:
+            return [self._top(np.zeros(len(self.names), dtype=np.float32), k) for _ in texts]
+        position = {row: i for i, row in enumerate(union)}
+        queries = np.zeros((len(texts), len(union)), dtype=np.float32)
+        for i, (rows, weights, norm) in enumerate(vectors):
+            if rows:
+                queries[i, [position[row] for row in rows]] = weights / norm
+        scores = queries @ self.matrix[union]
+        return [self._top(row, k) for row in scores]
+
+    # Best program for a text as (name, score), or (None, 0.0) when the catalog is empty
+    def best(self, text):
+        matches = self.query(text)
+        return matches[0] if matches else (None, 0.0)
@@ -0,0 +1,115 @@
+import bisect
+from collections import defaultdict
+
+from fuzzywuzzy import fuzz, utils
+
+
+# The same normalization process.extractOne applies to the query and every choice for token_set_ratio
+def process_name(text):
+    return utils.full_process(text, force_ascii=True)
+
+
+# Upper bound of fuzz.ratio for two strings of these lengths: at most the shorter string can match
+def length_bound(a, b):
+    return 2 * min(a, b) / (a + b) if a and b else 0
+
+
+# Precomputed replacement for process.extractOne(query, names, scorer=fuzz.token_set_ratio).
+# Every name is normalized and tokenized once; a query is only scored against names that share one of its
+# tokens, plus the names whose length alone still allows them to reach the best score found so far.
+# Results, including tie-breaking on the first name in catalog order, are identical to extractOne.
+class ProgramMatcher:
+    def __init__(self, names):
+        self.names = list(names)
+        self._processed = [process_name(name) for name in self.names]
+        self._tokens = [frozenset(processed.split()) for processed in self._processed]
+        self._sorted = [" ".join(sorted(tokens)) for tokens in self._tokens]
+
+        self._exact = {}
+        self._postings = defaultdict(list)
+        for index, (processed, tokens) in enumerate(zip(self._processed, self._tokens)):
+            self._exact.setdefault(processed, index)
+            for token in tokens:
+                self._postings[token].append(index)
+
+        by_length = sorted((len(sorted_tokens), index) for index, sorted_tokens in enumerate(self._sorted))
+        self._lengths = [length for length, _ in by_length]
+        self._by_length = [index for _, index in by_length]
+
+    def __len__(self):
+        return len(self.names)
+
+    # token_set_ratio of a processed query against the name at index, using the precomputed token sets.
+    # Returns -1 without running the expensive ratios when their length bound cannot reach floor.
+    def _score(self, query, query_tokens, index, floor=-1):
+        choice = self._processed[index]
+        if query == choice:
+            return 100
+        if not choice:
+            return 0
+        tokens = self._tokens[index]
+        sorted_sect = " ".join(sorted(query_tokens & tokens))
+        combined_1to2 = (sorted_sect + " " + " ".join(sorted(query_tokens - tokens))).strip()
+        combined_2to1 = (sorted_sect + " " + " ".join(sorted(tokens - query_tokens))).strip()
+        pairs = ((sorted_sect, combined_1to2), (sorted_sect, combined_2to1), (combined_1to2, combined_2to1))
+        if 100 * max(length_bound(len(a), len(b)) for a, b in pairs) < floor - 0.5:
+            return -1
+        return max(fuzz.ratio(a, b) for a, b in pairs)
+
+    # Best (name, score) for a query, or None for an empty catalog, exactly like process.extractOne
+    def extract_one(self, query):
+        if not self.names:
+            return None
+        query = process_name(query)
+        if not query:
+            # Every comparison against an empty query scores 0, except an equally empty name
+            index = self._exact.get("")
+            return (self.names[index], 100) if index is not None else (self.names[0], 0)
+
+        # An exact match scores 100, so only earlier names can still win the tie
+        best_index = self._exact.get(query)
+        best_score = 100 if best_index is not None else -1
+        query_tokens = frozenset(query.split())
+
+        candidates = set()
+        for token in query_tokens:
+            candidates.update(self._postings.get(token, ()))
+        for index in sorted(candidates):
+            if best_score == 100 and index >= best_index:
+                break
+            score = self._score(query, query_tokens, index, best_score)
+            if score > best_score or (score == best_score and index < best_index):
+                best_score, best_index = score, index
+
+        # Names without a shared token score ratio(sorted query tokens, sorted name tokens), which can never
+        # exceed 2 * min(len) / (sum of lengths). Walk outwards from the query length until that bound drops
+        # below the best score.
+        sorted_query = " ".join(sorted(query_tokens))
+        query_length = len(sorted_query)
+        right = bisect.bisect_left(self._lengths, query_length)
+        left = right - 1
+        while left >= 0 or right < len(self._lengths):
+            left_bound = length_bound(self._lengths[left], query_length) if left >= 0 else -1
+            right_bound = length_bound(self._lengths[right], query_length) if right < len(self._lengths) else -1
+            if left_bound >= right_bound:
+                bound, position, left = left_bound, left, left - 1
+            else:
+                bound, position, right = right_bound, right, right + 1
+            if 100 * bound < best_score - 0.5:
+                break
+            index = self._by_length[position]
+            if index in candidates or (best_score == 100 and index >= best_index):
+                continue
+            score = fuzz.ratio(sorted_query, self._sorted[index]) if self._processed[index] else 0
+            if score > best_score or (score == best_score and index < best_index):
+                best_score, best_index = score, index
+
+        return self.names[best_index], best_score
+
+    # extract_one for several queries, scoring repeated queries only once
+    def match_many(self, queries):
+        results = {}
+        for query in queries:
+            if query not in results:
+                results[query] = self.extract_one(query)
+        return [results[query] for query in queries]
@@ -0,0 +1,186 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+# Shared behaviour for the LLM response caches: entries are grouped by namespace ("advice", "program", ...),
+# expire after ttl seconds and the least recently used entries are evicted once max_entries is exceeded.
+# Expired entries are kept until they are replaced or evicted, so get(..., allow_expired=True) can still serve
+# them while the LLM is unavailable. Entries in pinned_namespaces hold data that cannot be regenerated (e.g.
+# the inputs behind a shared link): they never expire and are not counted towards max_entries, but have their
+# own, larger LRU limit of max_pinned_entries so they cannot grow without bound.
+class ResponseCache:
+    def __init__(self, ttl=None, max_entries=None, pinned_namespaces=(), max_pinned_entries=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.pinned_namespaces = frozenset(pinned_namespaces)
+        self.max_pinned_entries = max_pinned_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.namespace_stats = {}
+        self._stats_lock = threading.Lock()
+
+    def get(self, namespace, key, allow_expired=False):
+        raise NotImplementedError
+
+    def set(self, namespace, key, value):
+        raise NotImplementedError
+
+    def _expired(self, namespace, created, now):
+        return bool(self.ttl) and namespace not in self.pinned_namespaces and now - created > self.ttl
+
+    def _record(self, namespace, hit):
+        with self._stats_lock:
+            counts = self.namespace_stats.setdefault(namespace, {'hits': 0, 'misses': 0})
+            if hit:
+                self.hits += 1
+                counts['hits'] += 1
+            else:
+                self.misses += 1
+                counts['misses'] += 1
+
+    def stats(self):
+        with self._stats_lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'namespaces': {namespace: dict(counts) for namespace, counts in self.namespace_stats.items()}}
+
+
+# Per-process cache, useful for development and for the desktop client
+class MemoryCache(ResponseCache):
+    def __init__(self, ttl=None, max_entries=None, pinned_namespaces=(), max_pinned_entries=None):
+        super().__init__(ttl, max_entries, pinned_namespaces, max_pinned_entries)
+        self._entries = OrderedDict()
+        self._pinned = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, namespace, key, allow_expired=False):
+        now = time.time()
+        with self._lock:
+            entries = self._pinned if namespace in self.pinned_namespaces else self._entries
+            entry = entries.get((namespace, key))
+            if entry is not None and not allow_expired and self._expired(namespace, entry[1], now):
+                entry = None
+            if entry is not None:
+                entries.move_to_end((namespace, key))
+        self._record(namespace, entry is not None)
+        return entry[0] if entry is not None else None
+
+    def set(self, namespace, key, value):
+        with self._lock:
+            if namespace in self.pinned_namespaces:
+                entries, max_entries = self._pinned, self.max_pinned_entries
+            else:
+                entries, max_entries = self._entries, self.max_entries
+            entries[(namespace, key)] = (value, time.time())
+            entries.move_to_end((namespace, key))
+            while max_entries and len(entries) > max_entries:
+                entries.popitem(last=False)
+                self.evictions += 1
+
+
+# SQLite-backed cache shared by every gunicorn worker on the host and kept across restarts. A hit only records
+# its access time when the stored one is more than touch_interval seconds old, so most hits stay read-only
+# instead of queueing every worker's reads on SQLite's single writer lock; LRU order is kept to that precision.
+class SQLiteCache(ResponseCache):
+    def __init__(self, path, ttl=None, max_entries=None, pinned_namespaces=(), max_pinned_entries=None,
+                 touch_interval=60):
+        super().__init__(ttl, max_entries, pinned_namespaces, max_pinned_entries)
+        self.path = path
+        self.touch_interval = touch_interval
+        self._pinned = f"namespace IN ({', '.join('?' * len(self.pinned_namespaces))})"
+        self._local = threading.local()
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL, PRIMARY KEY (namespace, key))"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+    # sqlite3 connections cannot be shared between threads or forked processes, so keep one per thread
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, namespace, key, allow_expired=False):
+        now = time.time()
+        value = None
+        try:
+            connection = self._connect()
+            row = connection.execute(
+                "SELECT value, created, accessed FROM responses WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+            if row is not None and (allow_expired or not self._expired(namespace, row[1], now)):
+                value = json.loads(row[0])
+                if now - row[2] > self.touch_interval:
+                    self._touch(connection, namespace, key, now)
+        except sqlite3.Error as e:
+            logging.error("Error occurred while reading from the response cache: %s", e)
+        self._record(namespace, value is not None)
+        return value
+
+    # A failed access time update only costs LRU precision; the value read is still returned
+    def _touch(self, connection, namespace, key, now):
+        try:
+            with connection:
+                connection.execute(
+                    "UPDATE responses SET accessed = ? WHERE namespace = ? AND key = ?", (now, namespace, key)
+                )
+        except sqlite3.Error as e:
+            logging.warning("Could not update the access time of a cached response: %s", e)
+
+    def set(self, namespace, key, value):
+        now = time.time()
+        try:
+            connection = self._connect()
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO responses (namespace, key, value, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                    (namespace, key, json.dumps(value), now, now)
+                )
+                if namespace in self.pinned_namespaces:
+                    self._evict(connection, self._pinned, self.max_pinned_entries)
+                else:
+                    self._evict(connection, f"NOT {self._pinned}", self.max_entries)
+        except sqlite3.Error as e:
+            logging.error("Error occurred while writing to the response cache: %s", e)
+
+    # Delete the least recently used entries matching condition (the pinned or the other namespaces) beyond
+    # max_entries
+    def _evict(self, connection, condition, max_entries):
+        if not max_entries:
+            return
+        pinned = tuple(self.pinned_namespaces)
+        evicted = connection.execute(
+            f"DELETE FROM responses WHERE rowid IN (SELECT rowid FROM responses WHERE {condition} ORDER BY accessed "
+            f"LIMIT max(0, (SELECT count(*) FROM responses WHERE {condition}) - ?))",
+            (*pinned, *pinned, max_entries)
+        ).rowcount
+        if evicted > 0:
+            with self._stats_lock:
+                self.evictions += evicted
+
+
+# Build the cache selected by the cache_* settings in config.json
+def create_cache(config, pinned_namespaces=()):
+    backend = config.get('cache_backend', 'sqlite')
+    ttl = config.get('cache_ttl_seconds', 7 * 24 * 60 * 60)
+    max_entries = config.get('cache_max_entries', 10000)
+    max_pinned_entries = config.get('cache_max_pinned_entries', 100000)
+    if backend == 'memory':
+        return MemoryCache(ttl, max_entries, pinned_namespaces, max_pinned_entries)
+    if backend == 'sqlite':
+        return SQLiteCache(config.get('cache_path', 'response_cache.sqlite3'), ttl, max_entries, pinned_namespaces,
+                           max_pinned_entries, config.get('cache_touch_seconds', 60))
+    raise ValueError(f"Unknown cache backend: {backend}")
@@ -0,0 +1,90 @@
+import asyncio
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+# Coalesces concurrent calls with the same key into one upstream call: the first caller (the leader) runs
+# it and every caller that arrives while it is in flight waits for, and gets, the same result or error.
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._futures = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    # Returns (call, True) when the caller leads the call for key and must finish() it, or (call, False)
+    # when it joined a call already in flight and should wait() for it
+    def join(self, key):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                return call, False
+            call = self._calls[key] = _Call()
+            self.calls += 1
+            return call, True
+
+    def finish(self, key, call, result=None, error=None):
+        call.result, call.error = result, error
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.event.set()
+
+    @staticmethod
+    def wait(call):
+        call.event.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def do(self, key, fn, *args, **kwargs):
+        call, leader = self.join(key)
+        if not leader:
+            return self.wait(call)
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self.finish(key, call, error=e)
+            raise
+        self.finish(key, call, result)
+        return result
+
+    # Event-loop counterpart of do() for coroutine functions
+    async def do_async(self, key, fn, *args, **kwargs):
+        loop_key = (id(asyncio.get_running_loop()), key)
+        with self._lock:
+            future = self._futures.get(loop_key)
+            if future is None:
+                future = self._futures[loop_key] = asyncio.get_running_loop().create_future()
+                self.calls += 1
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+        if not leader:
+            return await asyncio.shield(future)
+        try:
+            result = await fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting for it
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._futures[loop_key]
+
+    def stats(self):
+        with self._lock:
+            return {'calls': self.calls, 'coalesced': self.coalesced}
@@ -0,0 +1,67 @@
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+
+from flask import abort, request, send_from_directory
+
+# Browsers may keep a versioned asset for a year: its URL changes whenever the file does
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+STATIC_CACHE_CONTROL = "public, max-age=3600"
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+
+# Hash every static file for its ?v= version and write a .gz copy next to each compressible one that is missing
+# or older than its source. Returns {filename: version}.
+def precompress(folder):
+    versions = {}
+    for directory, _, files in os.walk(folder):
+        for name in files:
+            if name.endswith('.gz'):
+                continue
+            path = os.path.join(directory, name)
+            with open(path, 'rb') as static_file:
+                content = static_file.read()
+            filename = os.path.relpath(path, folder).replace(os.sep, '/')
+            versions[filename] = hashlib.sha256(content).hexdigest()[:12]
+
+            content_type = mimetypes.guess_type(name)[0] or ''
+            if not content_type.startswith(COMPRESSIBLE_TYPES):
+                continue
+            compressed_path = path + '.gz'
+            if os.path.exists(compressed_path) and os.path.getmtime(compressed_path) >= os.path.getmtime(path):
+                continue
+            # Every gunicorn worker precompresses at import, so each writes its own temporary file
+            temporary_path = f"{compressed_path}.{os.getpid()}.tmp"
+            try:
+                with open(temporary_path, 'wb') as compressed_file:
+                    compressed_file.write(gzip.compress(content, compresslevel=9, mtime=0))
+                os.replace(temporary_path, compressed_path)
+            except OSError as e:
+                logging.warning("Could not precompress %s, serving it uncompressed: %s", filename, e)
+    return versions
+
+
+def accepts_gzip():
+    return any(encoding.split(';')[0].strip() == 'gzip'
+               for encoding in request.headers.get('Accept-Encoding', '').split(','))
+
+
+# Serve a static file, using its .gz copy for clients that accept gzip. Requests carrying the file's current
+# ?v= version are cacheable for a year; others are revalidated hourly.
+def send_static(folder, filename, versions):
+    if filename.endswith('.gz') or filename not in versions:
+        abort(404)
+    compressed_path = os.path.join(folder, filename + '.gz')
+    if accepts_gzip() and os.path.exists(compressed_path):
+        response = send_from_directory(folder, filename + '.gz', mimetype=mimetypes.guess_type(filename)[0],
+                                       conditional=True, etag=f"{versions[filename]}-gz")
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = send_from_directory(folder, filename, conditional=True, etag=versions[filename])
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = (
+        IMMUTABLE_CACHE_CONTROL if request.args.get('v') == versions[filename] else STATIC_CACHE_CONTROL)
+    return response
+
@@ -0,0 +1,174 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import httpx
+import pytest
+from openai import InternalServerError, RateLimitError
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from governor import CircuitBreaker, LLMUnavailable, RateGovernor  # noqa: E402
+
+
+def api_error(error_class, status, headers=None):
+    response = httpx.Response(status, request=httpx.Request('POST', 'http://azure.test/'),
+                              headers=headers or {'retry-after-ms': '0'})
+    return error_class("error", response=response, body=None)
+
+
+def failing(error):
+    def create():
+        raise error
+    return create
+
+
+# Moves the breaker's opening back by its cooldown, so the next call is let through as the half-open probe
+def end_cooldown(breaker):
+    breaker.opened_at -= breaker.cooldown
+
+
+def open_breaker(governor):
+    with pytest.raises(LLMUnavailable):
+        governor.call('test', failing(api_error(InternalServerError, 500)))
+    assert governor.breaker.state == 'open'
+
+
+def test_breaker_opens_after_consecutive_failures_and_refuses_calls():
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=30)
+    breaker.fail()
+    assert breaker.state == 'closed'
+    breaker.fail()
+    assert breaker.state == 'open'
+
+    wait, probe = breaker.check()
+    assert wait > 0 and not probe
+
+
+def test_breaker_lets_one_probe_through_and_closes_when_it_succeeds():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=30)
+    breaker.fail()
+    end_cooldown(breaker)
+    assert breaker.state == 'half-open'
+
+    assert breaker.check() == (None, True)
+    wait, probe = breaker.check()
+    assert wait is not None and not probe
+
+    breaker.succeed()
+    assert breaker.state == 'closed'
+    assert breaker.check() == (None, False)
+
+
+def test_failed_probe_reopens_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=30)
+    breaker.fail()
+    end_cooldown(breaker)
+    assert breaker.check() == (None, True)
+
+    breaker.fail()
+    assert breaker.state == 'open'
+    assert breaker.check()[0] > 1
+
+
+def test_governor_refuses_calls_while_the_breaker_is_open():
+    governor = RateGovernor(max_retries=1, breaker=CircuitBreaker(failure_threshold=2, cooldown=30))
+    open_breaker(governor)
+
+    with pytest.raises(LLMUnavailable) as error:
+        governor.call('test', lambda: "never called")
+    assert error.value.retry_after > 0
+
+
+def test_cancelled_async_probe_releases_the_breaker():
+    governor = RateGovernor(max_retries=0, breaker=CircuitBreaker(failure_threshold=1, cooldown=30))
+    open_breaker(governor)
+    end_cooldown(governor.breaker)
+
+    async def hang():
+        await asyncio.sleep(60)
+
+    async def cancel_probe():
+        task = asyncio.create_task(governor.call_async('test', hang))
+        await asyncio.sleep(0.01)
+        assert governor.breaker.probing
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_probe())
+    assert governor.breaker.state == 'open'
+    assert not governor.breaker.probing
+
+    end_cooldown(governor.breaker)
+    assert governor.call('test', lambda: "ok") == "ok"
+    assert governor.breaker.state == 'closed'
+
+
+def test_interrupted_sync_probe_releases_the_breaker():
+    governor = RateGovernor(max_retries=0, breaker=CircuitBreaker(failure_threshold=1, cooldown=30))
+    open_breaker(governor)
+    end_cooldown(governor.breaker)
+
+    with pytest.raises(KeyboardInterrupt):
+        governor.call('test', failing(KeyboardInterrupt()))
+    assert not governor.breaker.probing
+
+    end_cooldown(governor.breaker)
+    assert governor.call('test', lambda: "ok") == "ok"
+
+
+def test_rate_limited_attempts_do_not_trip_the_breaker():
+    governor = RateGovernor(max_retries=4, breaker=CircuitBreaker(failure_threshold=2, cooldown=30))
+    with pytest.raises(LLMUnavailable):
+        governor.call('test', failing(api_error(RateLimitError, 429)))
+
+    assert governor.breaker.state == 'closed'
+    assert governor.breaker.failures == 0
+
+
+def test_rate_limited_probe_closes_the_breaker():
+    governor = RateGovernor(max_retries=1, breaker=CircuitBreaker(failure_threshold=1, cooldown=30))
+    open_breaker(governor)
+    end_cooldown(governor.breaker)
+
+    attempts = []
+
+    def limited_once():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise api_error(RateLimitError, 429)
+        return "ok"
+
+    assert governor.call('test', limited_once) == "ok"
+    assert governor.breaker.state == 'closed'
+
+
+def test_retry_after_past_the_deadline_gives_up_without_waiting():
+    governor = RateGovernor(max_retries=4, deadline=20, breaker=CircuitBreaker(failure_threshold=5, cooldown=30))
+    start = time.monotonic()
+    with pytest.raises(LLMUnavailable) as error:
+        governor.call('test', failing(api_error(RateLimitError, 429, {'retry-after': '30'})))
+
+    assert time.monotonic() - start < 1
+    assert error.value.retry_after == 30
+
+
+def test_retryable_errors_are_retried_until_an_attempt_succeeds():
+    governor = RateGovernor(max_retries=4, breaker=CircuitBreaker(failure_threshold=5, cooldown=30))
+    attempts = []
+    lock = threading.Lock()
+
+    def flaky():
+        with lock:
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise api_error(InternalServerError, 500)
+        return "ok"
+
+    assert governor.call('test', flaky) == "ok"
+    assert len(attempts) == 3
+    assert governor.breaker.failures == 0
@@ -0,0 +1,117 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import response_cache  # noqa: E402
+from response_cache import MemoryCache, SQLiteCache  # noqa: E402
+
+
+# Replaces the clock the caches stamp and expire entries with; advance it with clock.now += seconds
+@pytest.fixture
+def clock(monkeypatch):
+    fake = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(response_cache, 'time', SimpleNamespace(time=lambda: fake.now))
+    return fake
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def make_cache(request, tmp_path, clock):
+    def make(**kwargs):
+        if request.param == 'memory':
+            return MemoryCache(**kwargs)
+        return SQLiteCache(str(tmp_path / 'cache.sqlite3'), touch_interval=0, **kwargs)
+    return make
+
+
+def test_values_round_trip_per_namespace(make_cache):
+    cache = make_cache()
+    cache.set('advice', 'key', {'text': "advice", 'items': [1, 2]})
+    cache.set('professions', 'key', ["Nurse"])
+
+    assert cache.get('advice', 'key') == {'text': "advice", 'items': [1, 2]}
+    assert cache.get('professions', 'key') == ["Nurse"]
+    assert cache.get('advice', 'other') is None
+    assert cache.stats()['namespaces']['advice'] == {'hits': 1, 'misses': 1}
+
+
+def test_expired_entries_are_misses_but_kept_for_stale_reads(make_cache, clock):
+    cache = make_cache(ttl=60)
+    cache.set('advice', 'key', "advice")
+
+    clock.now += 59
+    assert cache.get('advice', 'key') == "advice"
+    clock.now += 2
+    assert cache.get('advice', 'key') is None
+    assert cache.get('advice', 'key', allow_expired=True) == "advice"
+
+
+def test_least_recently_used_entry_is_evicted(make_cache, clock):
+    cache = make_cache(max_entries=2)
+    cache.set('advice', 'a', "a")
+    clock.now += 1
+    cache.set('advice', 'b', "b")
+    clock.now += 1
+    assert cache.get('advice', 'a') == "a"
+    clock.now += 1
+    cache.set('advice', 'c', "c")
+
+    assert cache.get('advice', 'a') == "a"
+    assert cache.get('advice', 'b') is None
+    assert cache.get('advice', 'c') == "c"
+    assert cache.stats()['evictions'] == 1
+
+
+def test_pinned_entries_never_expire_and_do_not_count_towards_max_entries(make_cache, clock):
+    cache = make_cache(ttl=60, max_entries=2, pinned_namespaces=('permalinks',))
+    cache.set('permalinks', 'link', {'major': "History"})
+    for key in 'abc':
+        clock.now += 1
+        cache.set('advice', key, key)
+
+    clock.now += 3600
+    assert cache.get('permalinks', 'link') == {'major': "History"}
+    assert cache.get('advice', 'a', allow_expired=True) is None
+    assert cache.get('advice', 'c', allow_expired=True) == "c"
+
+
+def test_pinned_entries_have_their_own_lru_limit(make_cache, clock):
+    cache = make_cache(max_entries=1, pinned_namespaces=('permalinks',), max_pinned_entries=2)
+    cache.set('advice', 'key', "advice")
+    for key in 'abc':
+        clock.now += 1
+        cache.set('permalinks', key, key)
+
+    assert cache.get('permalinks', 'a') is None
+    assert cache.get('permalinks', 'b') == "b"
+    assert cache.get('permalinks', 'c') == "c"
+    assert cache.get('advice', 'key') == "advice"
+
+
+def accessed(cache, key):
+    return cache._connect().execute(
+        "SELECT accessed FROM responses WHERE namespace = 'advice' AND key = ?", (key,)).fetchone()[0]
+
+
+def test_sqlite_hits_only_write_the_access_time_once_it_is_stale(tmp_path, clock):
+    cache = SQLiteCache(str(tmp_path / 'cache.sqlite3'), touch_interval=60)
+    cache.set('advice', 'key', "advice")
+    written = clock.now
+
+    clock.now += 30
+    assert cache.get('advice', 'key') == "advice"
+    assert accessed(cache, 'key') == written
+
+    clock.now += 31
+    assert cache.get('advice', 'key') == "advice"
+    assert accessed(cache, 'key') == clock.now
+
+
+def test_sqlite_cache_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    SQLiteCache(path).set('advice', 'key', "advice")
+    assert SQLiteCache(path).get('advice', 'key') == "advice"
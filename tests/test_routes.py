@@ -0,0 +1,42 @@
+import json
+import os
+import re
+import sys
+import tempfile
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+# CareerAdvice configures itself on import, so point it at a throwaway config: in-memory cache, no catalog
+# snapshot and a catalog URL that fails at once instead of reaching the website
+@pytest.fixture(scope='module')
+def client():
+    workdir = tempfile.mkdtemp(prefix="careeradvice-test-")
+    config_path = os.path.join(workdir, 'config.json')
+    with open(config_path, 'w') as config_file:
+        json.dump({'azure_openai_api_key': 'test', 'azure_endpoint': 'http://127.0.0.1:9',
+                   'api_version': '2024-03-01-preview', 'cache_backend': 'memory',
+                   'catalog_snapshot_path': os.path.join(workdir, 'programs_snapshot.json'),
+                   'programs_url': 'http://127.0.0.1:9/academics/all/'}, config_file)
+    os.environ['CAREERADVICE_CONFIG'] = config_path
+    cwd = os.getcwd()
+    os.chdir(ROOT)
+    try:
+        import CareerAdvice
+    finally:
+        os.chdir(cwd)
+    return CareerAdvice.app.test_client()
+
+
+def test_advice_page_stream_url_keeps_every_argument(client):
+    response = client.get('/advice', query_string={'major': 'History', 'interests': 'war & "peace"'})
+    assert response.status_code == 200
+
+    match = re.search(r"const streamUrl = (.*);", response.get_data(as_text=True))
+    stream_url = json.loads(match.group(1))
+    assert urlsplit(stream_url).path == '/generate_advice/stream'
+    assert parse_qs(urlsplit(stream_url).query) == {'major': ['History'], 'interests': ['war & "peace"']}
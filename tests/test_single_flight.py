@@ -0,0 +1,137 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from single_flight import SingleFlight  # noqa: E402
+
+
+# Runs flight.do(key, fn) on count threads while fn is held back, so every caller after the first joins the
+# leader's call; returns each thread's result or exception
+def run_coalesced(flight, key, fn, count):
+    release = threading.Event()
+    calls = []
+
+    def held_fn():
+        calls.append(1)
+        release.wait(5)
+        return fn()
+
+    outcomes = [None] * count
+
+    def caller(index):
+        try:
+            outcomes[index] = flight.do(key, held_fn)
+        except Exception as e:
+            outcomes[index] = e
+
+    threads = [threading.Thread(target=caller, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while flight.stats()['calls'] + flight.stats()['coalesced'] < count and time.monotonic() < deadline:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    return outcomes, len(calls)
+
+
+def test_leader_result_is_shared_with_every_coalesced_caller():
+    flight = SingleFlight()
+    outcomes, calls = run_coalesced(flight, 'key', lambda: {'advice': "text"}, 5)
+
+    assert calls == 1
+    assert all(outcome == {'advice': "text"} for outcome in outcomes)
+    assert flight.stats() == {'calls': 1, 'coalesced': 4}
+
+
+def test_leader_error_is_raised_in_every_coalesced_caller():
+    flight = SingleFlight()
+    error = ValueError("upstream failed")
+
+    def fail():
+        raise error
+
+    outcomes, calls = run_coalesced(flight, 'key', fail, 4)
+
+    assert calls == 1
+    assert all(outcome is error for outcome in outcomes)
+
+
+def test_finished_call_is_not_shared_with_later_callers():
+    flight = SingleFlight()
+    assert flight.do('key', lambda: 1) == 1
+    assert flight.do('key', lambda: 2) == 2
+    assert flight.stats() == {'calls': 2, 'coalesced': 0}
+
+
+def test_different_keys_are_not_coalesced():
+    flight = SingleFlight()
+    first, first_leads = flight.join('a')
+    second, second_leads = flight.join('b')
+
+    assert first_leads and second_leads
+    assert first is not second
+
+
+def test_join_and_finish_hand_the_result_to_waiters():
+    flight = SingleFlight()
+    call, leader = flight.join('key')
+    joined, joined_leads = flight.join('key')
+    assert leader and not joined_leads and joined is call
+
+    flight.finish('key', call, "advice")
+    assert flight.wait(joined) == "advice"
+    assert flight.join('key')[1]
+
+
+def test_async_leader_result_and_error_fan_out():
+    flight = SingleFlight()
+    calls = []
+
+    async def slow(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    async def main():
+        results = await asyncio.gather(*(flight.do_async('ok', slow, "advice") for _ in range(3)))
+        error = RuntimeError("upstream failed")
+        failures = await asyncio.gather(*(flight.do_async('fail', slow, error) for _ in range(3)),
+                                        return_exceptions=True)
+        return results, failures, error
+
+    results, failures, error = asyncio.run(main())
+    assert results == ["advice"] * 3
+    assert all(failure is error for failure in failures)
+    assert len(calls) == 2
+    assert flight.stats() == {'calls': 2, 'coalesced': 4}
+
+
+def test_cancelled_async_follower_does_not_cancel_the_leader():
+    flight = SingleFlight()
+
+    async def slow():
+        await asyncio.sleep(0.02)
+        return "advice"
+
+    async def main():
+        leader = asyncio.create_task(flight.do_async('key', slow))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do_async('key', slow))
+        await asyncio.sleep(0)
+        follower.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+        return await leader
+
+    assert asyncio.run(main()) == "advice"
@@ -0,0 +1,131 @@
+# Pre-generates the advice most requests ask for: every major in the program catalog with empty interests.
+# For each major it stores the advice, the parsed professions and their program URLs in the response cache, so
+# /generate_advice and the streaming page answer those requests without calling the LLM. Run it off-peak,
+# e.g. from cron:
+#
+#     python warm_cache.py --concurrency 4 --token-budget 500000 --requests-per-minute 60
+#
+# Re-running is incremental: majors whose professions are cached for the current catalog version and whose
+# advice has not expired are skipped, so after a catalog change only new majors and the program URLs of
+# changed ones are recomputed (their advice and program suggestions are usually still cached).
+
+import argparse
+import logging
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from governor import LLMUnavailable, TokenBucket
+from metrics import llm_tokens
+from program_catalog import program_base_name
+
+
+# The majors students type, from catalog names: "biology (b.s.)" and "biology - ecology (b.s.)" become "biology"
+def catalog_majors(names):
+    return list(dict.fromkeys(program_base_name(name) for name in names))
+
+
+def tokens_used():
+    return sum(value for _, _, value in llm_tokens.samples())
+
+
+class CacheWarmer:
+    def __init__(self, career_advice, concurrency=4, token_budget=0, interests=""):
+        self.career_advice = career_advice
+        self.concurrency = concurrency
+        self.token_budget = token_budget
+        self.interests = interests
+        self.counts = {'warmed': 0, 'skipped': 0, 'failed': 0}
+        self._lock = threading.Lock()
+        self._tokens_at_start = tokens_used()
+
+    def tokens_spent(self):
+        return tokens_used() - self._tokens_at_start
+
+    def over_budget(self):
+        return bool(self.token_budget) and self.tokens_spent() >= self.token_budget
+
+    def is_warm(self, major):
+        cache_key = self.career_advice.advice_cache_key(major, self.interests)
+        advice = self.career_advice.response_cache.get('advice', cache_key)
+        return advice is not None and self.career_advice.cached_professions(cache_key, advice) is not None
+
+    def warm(self, major):
+        if self.is_warm(major):
+            return 'skipped'
+        career_advice = self.career_advice
+        cache_key = career_advice.advice_cache_key(major, self.interests)
+        advice = career_advice.generate_career_advice(major, self.interests)
+        career_advice.advice_professions(cache_key, advice)
+        return 'warmed'
+
+    def count(self, outcome):
+        with self._lock:
+            self.counts[outcome] += 1
+
+    # Warm majors, at most concurrency at a time, until they are done, the token budget is spent or the LLM
+    # becomes unavailable
+    def run(self, majors):
+        stopped = None
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="cache-warmer") as executor:
+            pending = {}
+            majors = iter(majors)
+            while True:
+                while stopped is None and len(pending) < self.concurrency:
+                    major = next(majors, None)
+                    if major is None:
+                        break
+                    pending[executor.submit(self.warm, major)] = major
+                if not pending:
+                    break
+
+                future = next(as_completed(pending))
+                major = pending.pop(future)
+                try:
+                    self.count(future.result())
+                except LLMUnavailable as e:
+                    self.count('failed')
+                    stopped = stopped or f"the LLM is unavailable ({e})"
+                except Exception as e:
+                    logging.error("Error occurred while warming the cache for %s: %s", major, e)
+                    self.count('failed')
+                if stopped is None and self.over_budget():
+                    stopped = f"the token budget of {self.token_budget} is spent"
+        return stopped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm the response cache with default advice for every major.")
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--token-budget', type=int, default=0, help="stop after this many LLM tokens (0: no limit)")
+    parser.add_argument('--requests-per-minute', type=int, default=0,
+                        help="pace this job's LLM calls below the configured quota (0: the configured quota)")
+    parser.add_argument('--limit', type=int, default=0, help="warm at most this many majors")
+    parser.add_argument('--log-level', default='WARNING')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level, format='%(asctime)s - %(levelname)s - %(message)s')
+    import CareerAdvice
+
+    if args.requests_per_minute:
+        CareerAdvice.governor.requests = TokenBucket(args.requests_per_minute)
+    catalog = CareerAdvice.program_catalog.current
+    majors = catalog_majors(catalog.names)
+    if args.limit:
+        majors = majors[:args.limit]
+    if not majors:
+        raise SystemExit("The program catalog is empty; run python program_catalog.py refresh first.")
+
+    print(f"Warming {len(majors)} majors from catalog {catalog.version}.", file=sys.stderr)
+    warmer = CacheWarmer(CareerAdvice, args.concurrency, args.token_budget)
+    start = time.time()
+    stopped = warmer.run(majors)
+    counts = warmer.counts
+    print(f"{counts['warmed']} warmed, {counts['skipped']} already warm, {counts['failed']} failed in "
+          f"{time.time() - start:.1f}s using {warmer.tokens_spent()} tokens"
+          + (f"; stopped because {stopped}" if stopped else ""), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()